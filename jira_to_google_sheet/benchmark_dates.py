@@ -0,0 +1,93 @@
+# Compares load_siglo_report's parsing of Jira date-strings (parse_jira_date)
+# with the former strptime + strftime on the dates of a synthetic filter
+# uses Python3
+# example: python benchmark_dates.py --issues 10000 --repeat 5
+
+# author: Paco Abato - pacoabato@gmail.com
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import timeit
+from datetime import date, datetime
+
+import fake_services
+import load_siglo_report
+
+
+def strptime_dates(str_dates):
+	''' The former way: every date-string is parsed to show its day and month
+	(and the day parsed again to know how old it is).'''
+
+	today = datetime.today()
+	for str_date in str_dates:
+		if str_date is None or len(str_date) == 0:
+			continue
+		parsed = datetime.strptime(str_date, '%Y-%m-%dT%H:%M:%S.%f%z')
+		day = parsed.strftime('%d/%m/%Y')
+		parsed.strftime('%Y/%m')
+		(today - datetime.strptime(day, '%d/%m/%Y')).days
+
+
+def jira_dates(str_dates):
+	today = date.today().toordinal()
+	for str_date in str_dates:
+		jira_date = load_siglo_report.parse_jira_date(str_date)
+		if jira_date.ordinal is not None:
+			today - jira_date.ordinal
+
+
+def check_same_result(str_dates):
+	today = datetime.today()
+	for str_date in str_dates:
+		jira_date = load_siglo_report.parse_jira_date(str_date)
+		if not str_date:
+			assert jira_date.day == jira_date.month == ''
+			continue
+		parsed = datetime.strptime(str_date, '%Y-%m-%dT%H:%M:%S.%f%z')
+		assert jira_date.day == parsed.strftime('%d/%m/%Y'), str_date
+		assert jira_date.month == parsed.strftime('%Y/%m'), str_date
+		days = (today - datetime.strptime(jira_date.day, '%d/%m/%Y')).days
+		assert days == today.toordinal() - jira_date.ordinal, str_date
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Compares the parsing of Jira dates of load_siglo_report with strptime.')
+	parser.add_argument('--issues', type=int, default=10000, help='size of the synthetic filter')
+	parser.add_argument('--repeat', type=int, default=5, help='times each way is measured (the best is shown)')
+	args = parser.parse_args()
+
+	issues, worklogs = fake_services.generate_filter(args.issues)
+	# the dates read for each issue (created, updated and resolution) and worklog
+	str_dates = []
+	for issue in issues:
+		fields = issue['fields']
+		str_dates.extend([fields['created'], fields['updated'], fields['resolutiondate']])
+	for issue_worklogs in worklogs.values():
+		str_dates.extend(worklog['started'] for worklog in issue_worklogs)
+
+	check_same_result(str_dates)
+
+	print('Dates:', len(str_dates))
+	former = min(timeit.repeat(lambda: strptime_dates(str_dates), number=1, repeat=args.repeat))
+	load_siglo_report.parse_jira_day.cache_clear()
+	# the first run fills the cache, as in a report
+	current = min(timeit.repeat(lambda: jira_dates(str_dates), number=1, repeat=1))
+	cached = min(timeit.repeat(lambda: jira_dates(str_dates), number=1, repeat=args.repeat))
+	print('  strptime:                 {:8.3f} s'.format(former))
+	print('  parse_jira_date:          {:8.3f} s ({:.0f}x)'.format(current, former / current))
+	print('  parse_jira_date (cached): {:8.3f} s ({:.0f}x)'.format(cached, former / cached))
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,119 @@
+# Measures the memory taken by the worklogs and the rows of the JIRADATA and
+# TASKSDATA tabs of a synthetic filter kept as records (load_siglo_report's
+# Worklog, JiraDataRecord and TaskRecord) and as plain dicts and lists
+# uses Python3
+# example: python benchmark_memory.py --issues 10000 100000
+
+# author: Paco Abato - pacoabato@gmail.com
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import json
+import sys
+import tracemalloc
+
+import fake_services
+import load_siglo_report
+
+
+def dict_worklog(worklog):
+	''' The worklog as a dict (the shape used before the records).'''
+
+	return {
+		'id': worklog['id'],
+		'author': worklog['author']['displayName'],
+		'author_username': worklog['author']['name'],
+		'timeSpent': int(worklog['timeSpentSeconds']) / 3600,
+		'comment': worklog['comment'],
+		'started': load_siglo_report.format_long_date_string(worklog['started'], False),
+	}
+
+
+def build_plain(issues, responses):
+	worklogs = {issue_id: [dict_worklog(worklog) for worklog in json.loads(response)]
+		for issue_id, response in responses.items()}
+	jiradata = []
+	tasks_data = []
+	for issue in issues:
+		fields = issue['fields']
+		base = [fields['project']['name'], fields['issuetype']['name'], issue['key'], fields['summary'], 0, 0, 0]
+		for worklog in worklogs[issue['id']]:
+			row = []
+			row.extend(base)
+			row.extend([worklog['started'], worklog['author'], worklog['timeSpent'], worklog['comment'], 'No', 'No'])
+			jiradata.append(row)
+		tasks_data.append([issue['key'], fields['summary'], 'Sin asignar', 0, 0, 0,
+			fields['fixVersions'][0]['name'], fields['status']['name'], '', '', '', '', '', '', '', 'No', 'No'])
+	return worklogs, jiradata, tasks_data
+
+
+def build_records(issues, responses):
+	worklogs = {issue_id: [load_siglo_report.convert_worklog(worklog) for worklog in json.loads(response)]
+		for issue_id, response in responses.items()}
+	jiradata = []
+	tasks_data = []
+	for issue in issues:
+		fields = issue['fields']
+		base = (sys.intern(fields['project']['name']),
+			sys.intern(fields['issuetype']['name']), issue['key'], fields['summary'], 0, 0, 0)
+		jiradata.extend(load_siglo_report.get_jiradata_records(base, worklogs[issue['id']], 'No', 'No'))
+		tasks_data.append(load_siglo_report.TaskRecord(issue['key'], fields['summary'], 'Sin asignar', 0, 0, 0,
+			sys.intern(fields['fixVersions'][0]['name']),
+			sys.intern(fields['status']['name']), '', '', '', '', '', '', '', 'No', 'No'))
+	return worklogs, jiradata, tasks_data
+
+
+def measure(build, issues, responses):
+	''' Returns the bytes allocated by build (and still in use when it
+	returns) for the worklogs, the JIRADATA rows and the TASKSDATA rows.'''
+
+	tracemalloc.start()
+	try:
+		before = tracemalloc.get_traced_memory()[0]
+		worklogs, jiradata, tasks_data = build(issues, responses)
+		total = tracemalloc.get_traced_memory()[0] - before
+		del jiradata, tasks_data
+		only_worklogs = tracemalloc.get_traced_memory()[0] - before
+		del worklogs
+	finally:
+		tracemalloc.stop()
+	return {'total': total, 'worklogs': only_worklogs, 'rows': total - only_worklogs}
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Compares the memory taken by the records of load_siglo_report with plain dicts and lists.')
+	parser.add_argument('--issues', type=int, nargs='+', default=[10000, 100000],
+		help='sizes of the synthetic filters')
+	args = parser.parse_args()
+
+	for num_issues in args.issues:
+		issues, all_worklogs = fake_services.generate_filter(num_issues)
+		# worklogs are decoded from text (as from Jira's response) so no string is shared beforehand
+		responses = {issue_id: json.dumps(worklogs) for issue_id, worklogs in all_worklogs.items()}
+		num_worklogs = sum(len(worklogs) for worklogs in all_worklogs.values())
+		del all_worklogs
+
+		plain = measure(build_plain, issues, responses)
+		records = measure(build_records, issues, responses)
+
+		print('')
+		print('Issues:', num_issues, '- worklogs:', num_worklogs)
+		print('  {:<10} {:>14} {:>14} {:>10}'.format('', 'plain', 'records', 'saved'))
+		for name in ['worklogs', 'rows', 'total']:
+			print('  {:<10} {:>14} {:>14} {:>9.0%}'.format(
+				name, plain[name], records[name], 1 - records[name] / plain[name]))
+
+
+if __name__ == "__main__":
+	main()
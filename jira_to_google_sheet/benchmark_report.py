@@ -0,0 +1,249 @@
+# Measures load_siglo_report against the local stand-ins of fake_services
+# with synthetic filters of different sizes
+# uses Python3
+# example: python benchmark_report.py --issues 1000 10000 --config '{"parallelPages": true}'
+
+# author: Paco Abato - pacoabato@gmail.com
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import argparse
+import contextlib
+import functools
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import fake_services
+import load_siglo_report
+
+
+# phases of run_main in the order they are reported
+PHASES = ['config', 'issues', 'worklogs', 'analysis', 'upload']
+
+# Jira endpoints (see fake_services.FakeJira) used in each phase
+PHASE_ENDPOINTS = {
+	'issues': ['filter', 'search'],
+	'worklogs': ['issue/worklog', 'worklog/updated', 'worklog/deleted', 'worklog/list'],
+}
+
+# the stand-ins don't need the limits used with the real services
+BENCHMARK_CONFIG = {
+	'filterId': 1,
+	'team': ['user1', 'user2', 'user3'],
+	'requestsPerSecond': 0,
+	'sheetsRequestsPerMinute': 1000000,
+}
+
+
+class PhaseTimer:
+	''' Accumulates the time spent by the main thread in each phase and the
+	peak of memory traced while it lasted (if tracemalloc is running).
+	Nested calls of the same phase are counted once.'''
+
+	def __init__(self):
+		self.times = {}
+		self.peaks = {}
+		self.active = set()
+		self.main_thread = threading.main_thread()
+
+	@contextlib.contextmanager
+	def phase(self, name):
+		if name in self.active or threading.current_thread() is not self.main_thread:
+			yield
+			return
+
+		self.active.add(name)
+		start = time.perf_counter()
+		try:
+			yield
+		finally:
+			self.times[name] = self.times.get(name, 0) + time.perf_counter() - start
+			self.active.discard(name)
+			self.record_peak(name)
+
+	def record_peak(self, name):
+		if tracemalloc.is_tracing():
+			peak = tracemalloc.get_traced_memory()[1]
+			self.peaks[name] = max(self.peaks.get(name, 0), peak)
+			tracemalloc.reset_peak()
+
+
+def wrap_function(timer, owner, name, phase):
+	function = getattr(owner, name)
+
+	@functools.wraps(function)
+	def wrapper(*args, **kwargs):
+		with timer.phase(phase):
+			return function(*args, **kwargs)
+
+	setattr(owner, name, wrapper)
+	return function
+
+
+def wrap_generator(timer, owner, name, phase):
+	function = getattr(owner, name)
+
+	@functools.wraps(function)
+	def wrapper(*args, **kwargs):
+		iterator = function(*args, **kwargs)
+		while True:
+			with timer.phase(phase):
+				item = next(iterator, StopIteration)
+			if item is StopIteration:
+				return
+			yield item
+
+	setattr(owner, name, wrapper)
+	return function
+
+
+def run_benchmark(num_issues, latency, error_rate, page_size, extra_config, trace_memory):
+	''' Runs run_main against a synthetic filter of num_issues issues.
+	Returns a dict with the measures of each phase.'''
+
+	issues, worklogs = fake_services.generate_filter(num_issues)
+	# the filter is a part of the instance, whose worklogs are listed by the bulk backend too
+	other_worklogs = fake_services.generate_other_worklogs(3 * sum(len(issue_worklogs) for issue_worklogs in worklogs.values()))
+	fake_jira = fake_services.FakeJira(issues, worklogs, other_worklogs=other_worklogs,
+		latency=latency, max_page_size=page_size, error_rate=error_rate)
+	jira_url = fake_jira.start()
+	spreadsheet = fake_services.FakeSpreadsheet(load_siglo_report.SCRIPT_VERSION)
+
+	timer = PhaseTimer()
+	originals = [
+		(load_siglo_report, 'load_config', wrap_function(timer, load_siglo_report, 'load_config', 'config')),
+		# time waiting for the next page of issues (worklogs included, subtracted below)
+		(load_siglo_report, 'iter_report_pages', wrap_generator(timer, load_siglo_report, 'iter_report_pages', 'download')),
+		(load_siglo_report, 'find_all_worklogs', wrap_function(timer, load_siglo_report, 'find_all_worklogs', 'worklogs')),
+		(load_siglo_report, 'find_worklogs_by_issue', wrap_function(timer, load_siglo_report, 'find_worklogs_by_issue', 'worklogs')),
+		(load_siglo_report, 'sync_worklogs_bulk', wrap_function(timer, load_siglo_report, 'sync_worklogs_bulk', 'worklogs')),
+		(load_siglo_report.SheetWriter, 'send', wrap_function(timer, load_siglo_report.SheetWriter, 'send', 'upload')),
+	]
+
+	with tempfile.TemporaryDirectory() as base_dir:
+		config = dict(BENCHMARK_CONFIG)
+		config['jiraUrl'] = jira_url
+		config['pageSize'] = page_size
+		config.update(extra_config)
+		with open(os.path.join(base_dir, load_siglo_report.CONFIG_FILE), 'w') as f:
+			json.dump(config, f)
+		with open(os.path.join(base_dir, load_siglo_report.JIRA_CREDENTIALS_FILE), 'w') as f:
+			json.dump({'user_name': 'benchmark', 'password': 'benchmark'}, f)
+
+		load_siglo_report.BASE_DIR = base_dir + os.sep
+		load_siglo_report.google_sheets[load_siglo_report.GOOGLE_SHEET_NAME] = spreadsheet
+		load_siglo_report.jira_sessions.clear()
+		load_siglo_report.jira_rate_limiter = None
+
+		if trace_memory:
+			tracemalloc.start()
+		start = time.perf_counter()
+		try:
+			with contextlib.redirect_stdout(io.StringIO()):
+				load_siglo_report.run_main()
+		finally:
+			total = time.perf_counter() - start
+			timer.record_peak('analysis')
+			if trace_memory:
+				tracemalloc.stop()
+			for owner, name, function in originals:
+				setattr(owner, name, function)
+			fake_jira.stop()
+			load_siglo_report.google_sheets.clear()
+
+	download = timer.times.get('download', 0)
+	worklogs_time = timer.times.get('worklogs', 0)
+	times = {
+		'config': timer.times.get('config', 0),
+		'issues': download - worklogs_time,
+		'worklogs': worklogs_time,
+		'upload': timer.times.get('upload', 0),
+	}
+	times['analysis'] = total - sum(times.values())
+
+	phases = {}
+	for phase in PHASES:
+		requests = 0
+		num_bytes = 0
+		if phase == 'upload':
+			endpoints_stats = spreadsheet.stats.values()
+		else:
+			endpoints_stats = [fake_jira.stats[endpoint] for endpoint in PHASE_ENDPOINTS.get(phase, [])
+				if endpoint in fake_jira.stats]
+		for endpoint_stats in endpoints_stats:
+			requests += endpoint_stats['requests']
+			num_bytes += endpoint_stats['bytes']
+
+		peak = timer.peaks.get(phase, 0)
+		if phase == 'issues':
+			peak = max(peak, timer.peaks.get('download', 0))
+		phases[phase] = {
+			'seconds': round(times[phase], 3),
+			'requests': requests,
+			'bytes': num_bytes,
+			'peak_memory': peak if trace_memory else None,
+		}
+
+	return {
+		'issues': num_issues,
+		'worklogs': sum(len(issue_worklogs) for issue_worklogs in worklogs.values()),
+		'seconds': round(total, 3),
+		'tasks_uploaded': len(spreadsheet.get_rows(load_siglo_report.TAB_TASKSDATA)),
+		'phases': phases,
+	}
+
+
+def print_result(result):
+	print('')
+	print('Issues:', result['issues'], '- worklogs:', result['worklogs'],
+		'- total:', result['seconds'], 's - tasks uploaded:', result['tasks_uploaded'])
+	print('  {:<10} {:>10} {:>10} {:>14} {:>14}'.format('phase', 'seconds', 'requests', 'bytes', 'peak memory'))
+	for phase in PHASES:
+		measures = result['phases'][phase]
+		peak = measures['peak_memory']
+		print('  {:<10} {:>10.3f} {:>10} {:>14} {:>14}'.format(
+			phase, measures['seconds'], measures['requests'], measures['bytes'],
+			'-' if peak is None else peak))
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Benchmarks load_siglo_report against local stand-ins of Jira and Google Sheets.')
+	parser.add_argument('--issues', type=int, nargs='+', default=[1000, 10000, 100000],
+		help='sizes of the synthetic filters')
+	parser.add_argument('--latency', type=float, default=0, help='seconds added to every Jira response')
+	parser.add_argument('--error-rate', type=float, default=0, help='fraction of Jira requests answered with 503')
+	parser.add_argument('--page-size', type=int, default=1000, help='maximum issues per search page')
+	parser.add_argument('--config', default='{}', help='JSON with config.json values to use')
+	parser.add_argument('--no-memory', action='store_true', help="don't trace memory (faster)")
+	parser.add_argument('--json', help='file to write the results to')
+	args = parser.parse_args()
+
+	results = []
+	for num_issues in args.issues:
+		result = run_benchmark(num_issues, args.latency, args.error_rate, args.page_size,
+			json.loads(args.config), not args.no_memory)
+		print_result(result)
+		results.append(result)
+
+	if args.json:
+		with open(args.json, 'w') as f:
+			json.dump(results, f, indent='\t')
+
+
+if __name__ == "__main__":
+	main()
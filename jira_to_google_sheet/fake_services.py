@@ -0,0 +1,439 @@
+# Local stand-ins for Jira and Google Sheets so load_siglo_report can be run
+# (and measured) without network access
+# uses Python3
+
+# author: Paco Abato - pacoabato@gmail.com
+#    This program is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    This program is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from datetime import datetime, timedelta
+import threading
+import random
+import json
+import time
+import re
+
+
+JIRA_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.000+0000'
+
+# people that log work in the synthetic filters (the first ones log much more than the last ones)
+PEOPLE = [('user' + str(i), 'User ' + str(i)) for i in range(1, 31)]
+STATUSES = ['Open', 'In progress', 'Reopened', 'Paused', 'Blocked', 'Resolved', 'Closed', 'Rejected']
+STATUS_WEIGHTS = [15, 10, 2, 2, 1, 20, 45, 5]
+ISSUE_TYPES = ['Task', 'Bug', 'Improvement']
+PROJECTS = ['Project A', 'Project B', 'Project C', 'Project D']
+FIX_VERSIONS = ['v1.0', 'v1.1', 'v2.0', 'v2.1', 'v3.0']
+
+# maximum number of values of a page of worklog/updated and worklog/deleted (as Jira)
+CHANGED_WORKLOGS_PAGE_SIZE = 1000
+
+
+def generate_filter(num_issues, seed=1):
+	''' Generates num_issues issues (as returned by Jira's search) and their
+	worklogs. About one of every five issues is a parent with several
+	sub-tasks after it; most issues have a few worklogs and some of them
+	have many. Returns the list of issues and a dict with the issue's id as
+	key and the list of its worklogs (as returned by Jira) as value.'''
+
+	rnd = random.Random(seed)
+	start = datetime(2019, 1, 1)
+	issues = []
+	worklogs = {}
+	next_worklog_id = 10000
+	parent = None
+
+	for i in range(num_issues):
+		issue_id = str(100000 + i)
+		issue_key = 'REP-' + str(i + 1)
+		created = start + timedelta(minutes=rnd.randint(0, 200 * 24 * 60))
+		updated = created + timedelta(minutes=rnd.randint(0, 60 * 24 * 60))
+		status = rnd.choices(STATUSES, STATUS_WEIGHTS)[0]
+		resolved = updated if status in ('Resolved', 'Closed', 'Rejected') else None
+		original_estimate = rnd.choice([0, 3600, 4 * 3600, 8 * 3600, 16 * 3600, 40 * 3600])
+		remaining = 0 if resolved else rnd.choice([0, 3600, 4 * 3600, 8 * 3600])
+		assignee = rnd.choices(PEOPLE, [1 / (n + 1) for n in range(len(PEOPLE))])[0] if rnd.random() > 0.05 else None
+		summary = ('NP_' if rnd.random() < 0.03 else '') + 'Synthetic issue ' + str(i + 1) + ' ' + 'x' * rnd.randint(10, 80)
+
+		fields = {
+			'summary': summary,
+			'fixVersions': [{'name': rnd.choice(FIX_VERSIONS)}],
+			'assignee': {'displayName': assignee[1], 'name': assignee[0]} if assignee else None,
+			'status': {'name': status},
+			'created': created.strftime(JIRA_DATE_FORMAT),
+			'updated': updated.strftime(JIRA_DATE_FORMAT),
+			'resolutiondate': resolved.strftime(JIRA_DATE_FORMAT) if resolved else None,
+			'customfield_15190': {'value': 'Incidencia'} if rnd.random() < 0.1 else None,
+			'project': {'name': rnd.choice(PROJECTS)},
+			'issuetype': {'name': rnd.choice(ISSUE_TYPES)},
+			'timeoriginalestimate': original_estimate or None,
+			'timeestimate': remaining or None,
+			'timespent': None,
+			'aggregatetimeoriginalestimate': None,
+			'aggregatetimeestimate': None,
+			'aggregatetimespent': None,
+			# fields not used by the report that make the payload realistic
+			'description': 'Lorem ipsum dolor sit amet. ' * rnd.randint(5, 60),
+			'labels': ['synthetic'],
+		}
+
+		if parent is None or rnd.random() < 0.2:
+			parent = {'id': issue_id, 'key': issue_key, 'fields': {'summary': summary}}
+		else:
+			fields['parent'] = parent
+
+		# most issues have a few worklogs, some of them a lot
+		num_worklogs = min(int(rnd.expovariate(1 / 3)), 200)
+		issue_worklogs = []
+		time_spent = 0
+		for j in range(num_worklogs):
+			author = rnd.choices(PEOPLE, [1 / (n + 1) for n in range(len(PEOPLE))])[0] if j % 3 else (assignee or PEOPLE[0])
+			seconds = 900 * max(1, int(rnd.lognormvariate(1.5, 0.8)))
+			started = created + timedelta(minutes=rnd.randint(0, 30 * 24 * 60))
+			issue_worklogs.append({
+				'id': str(next_worklog_id),
+				'issueId': issue_id,
+				'author': {'displayName': author[1], 'name': author[0]},
+				'timeSpentSeconds': seconds,
+				'comment': 'Work on ' + issue_key,
+				'started': started.strftime(JIRA_DATE_FORMAT),
+				'updated': started.strftime(JIRA_DATE_FORMAT),
+			})
+			next_worklog_id += 1
+			time_spent += seconds
+		fields['timespent'] = time_spent or None
+
+		issues.append({'id': issue_id, 'key': issue_key, 'fields': fields})
+		worklogs[issue_id] = issue_worklogs
+
+	return issues, worklogs
+
+
+def generate_other_worklogs(num_worklogs, seed=2):
+	''' Generates num_worklogs worklogs (as returned by Jira) of issues that
+	are not in the filters of generate_filter, logged in the same dates:
+	the rest of the Jira instance, listed by worklog/updated too.'''
+
+	rnd = random.Random(seed)
+	start = datetime(2019, 1, 1)
+	worklogs = []
+	for i in range(num_worklogs):
+		author = rnd.choice(PEOPLE)
+		started = start + timedelta(minutes=rnd.randint(0, 230 * 24 * 60))
+		worklogs.append({
+			'id': str(50000000 + i),
+			'issueId': str(900000 + rnd.randint(0, num_worklogs // 3)),
+			'author': {'displayName': author[1], 'name': author[0]},
+			'timeSpentSeconds': 900 * rnd.randint(1, 16),
+			'comment': 'Work on another project',
+			'started': started.strftime(JIRA_DATE_FORMAT),
+			'updated': started.strftime(JIRA_DATE_FORMAT),
+		})
+	return worklogs
+
+
+class FakeJira:
+	''' Jira REST API stand-in serving the filter, search (with pagination,
+	fields projection and the JQL clauses used by the report), issue's
+	worklog and bulk worklog endpoints from an in-memory set of issues.
+
+	latency: seconds added to every response.
+	max_page_size: maximum number of issues returned by a search page.
+	error_rate: fraction of requests answered with error_status.
+	filters: dict with the IDs of the issues of each filter (by filter ID);
+	the filters not in it have every issue.
+	other_worklogs: worklogs of issues outside the filters (see
+	generate_other_worklogs), only listed by the bulk worklog endpoints.
+	Counts the requests and bytes sent per endpoint in stats.'''
+
+	def __init__(self, issues, worklogs, latency=0, max_page_size=1000, error_rate=0, error_status=503, seed=1, filters=None, other_worklogs=()):
+		self.issues = issues
+		self.filters = filters or {}
+		self.worklogs = worklogs
+		self.other_worklogs = list(other_worklogs)
+		self.deleted_worklogs = [] # {'worklogId': ..., 'updatedTime': ...}
+		self.latency = latency
+		self.max_page_size = max_page_size
+		self.error_rate = error_rate
+		self.error_status = error_status
+		self.random = random.Random(seed)
+		self.stats = {}
+		self.lock = threading.Lock()
+		self.server = None
+
+	def start(self):
+		''' Starts serving in a background thread. Returns the base URL (jiraUrl).'''
+
+		fake_jira = self
+
+		class Handler(BaseHTTPRequestHandler):
+			protocol_version = 'HTTP/1.1' # keep-alive
+
+			def log_message(self, *args):
+				pass
+
+			def do_GET(self):
+				fake_jira.handle(self, None)
+
+			def do_POST(self):
+				body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+				fake_jira.handle(self, json.loads(body or b'{}'))
+
+		self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+		self.server.daemon_threads = True
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		return 'http://127.0.0.1:' + str(self.server.server_port) + '/jira'
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def count(self, endpoint, num_bytes):
+		with self.lock:
+			endpoint_stats = self.stats.setdefault(endpoint, {'requests': 0, 'bytes': 0})
+			endpoint_stats['requests'] += 1
+			endpoint_stats['bytes'] += num_bytes
+
+	def handle(self, handler, body):
+		url = urlsplit(handler.path)
+		params = {name: values[0] for name, values in parse_qs(url.query).items()}
+		path = url.path
+
+		if path.endswith('/search'):
+			endpoint, response = 'search', self.search(params)
+		elif '/filter/' in path:
+			endpoint, response = 'filter', self.filter(handler, path)
+		elif path.endswith('/worklog/updated'):
+			endpoint, response = 'worklog/updated', self.worklogs_updated(handler, path, params)
+		elif path.endswith('/worklog/deleted'):
+			endpoint, response = 'worklog/deleted', self.worklogs_deleted(handler, path, params)
+		elif path.endswith('/worklog/list'):
+			endpoint, response = 'worklog/list', self.worklogs_list(body)
+		elif path.endswith('/worklog/'):
+			endpoint, response = 'issue/worklog', self.issue_worklogs(path)
+		else:
+			endpoint, response = 'unknown', None
+
+		if self.latency:
+			time.sleep(self.latency)
+
+		status = 200
+		if response is None:
+			status = 404
+			response = {'errorMessages': ['Not found']}
+		elif self.error_rate and self.random.random() < self.error_rate:
+			status = self.error_status
+			response = {'errorMessages': ['Injected error']}
+
+		data = json.dumps(response).encode('utf-8')
+		self.count(endpoint, len(data))
+		handler.send_response(status)
+		handler.send_header('Content-Type', 'application/json')
+		handler.send_header('Content-Length', str(len(data)))
+		if status in (429, 503):
+			handler.send_header('Retry-After', '0')
+		handler.end_headers()
+		handler.wfile.write(data)
+
+	def filter(self, handler, path):
+		base_url = 'http://' + handler.headers['Host'] + path[:path.index('/rest/')]
+		return {'searchUrl': base_url + '/rest/api/2/search?jql=filter%3D' + path.rstrip('/').split('/')[-1]}
+
+	def search(self, params):
+		jql = params.get('jql', '')
+		issues = self.issues
+
+		match = re.search(r'filter=(\w+)', jql)
+		if match and match.group(1) in self.filters:
+			ids = set(self.filters[match.group(1)])
+			issues = [issue for issue in issues if issue['id'] in ids]
+
+		match = re.search(r'updated >= "([^"]+)"', jql)
+		if match:
+			since = datetime.strptime(match.group(1), '%Y/%m/%d %H:%M')
+			issues = [issue for issue in issues
+				if datetime.strptime(issue['fields']['updated'], JIRA_DATE_FORMAT) >= since]
+
+		match = re.search(r'id in \(([^)]*)\)', jql)
+		if match:
+			ids = set(match.group(1).split(','))
+			issues = [issue for issue in issues if issue['id'] in ids]
+
+		start_at = int(params.get('startAt', 0))
+		max_results = min(int(params.get('maxResults', 50)), self.max_page_size)
+		page = issues[start_at:start_at + max_results]
+
+		if 'fields' in params:
+			fields = params['fields'].split(',')
+			page = [{'id': issue['id'], 'key': issue['key'],
+				'fields': {name: value for name, value in issue['fields'].items() if name in fields}}
+				for issue in page]
+
+		return {'startAt': start_at, 'maxResults': max_results, 'total': len(issues), 'issues': page}
+
+	def issue_worklogs(self, path):
+		issue_id = path.split('/issue/')[1].split('/')[0]
+		if issue_id not in self.worklogs:
+			return None
+		worklogs = self.worklogs[issue_id]
+		return {'startAt': 0, 'maxResults': len(worklogs), 'total': len(worklogs), 'worklogs': worklogs}
+
+	def iter_all_worklogs(self):
+		''' Generator that yields every worklog of the instance: the ones
+		of the filters' issues and other_worklogs.'''
+
+		for worklogs in self.worklogs.values():
+			yield from worklogs
+		yield from self.other_worklogs
+
+	def worklogs_updated(self, handler, path, params):
+		since = int(params.get('since', 0))
+		values = []
+		for worklog in self.iter_all_worklogs():
+			updated = int(datetime.strptime(worklog['updated'], JIRA_DATE_FORMAT).timestamp() * 1000)
+			if updated > since:
+				values.append({'worklogId': int(worklog['id']), 'updatedTime': updated})
+		return self.changed_worklogs_page(handler, path, values, since)
+
+	def worklogs_deleted(self, handler, path, params):
+		since = int(params.get('since', 0))
+		return self.changed_worklogs_page(handler, path,
+			[value for value in self.deleted_worklogs if value['updatedTime'] > since], since)
+
+	def changed_worklogs_page(self, handler, path, values, since):
+		''' Returns the first CHANGED_WORKLOGS_PAGE_SIZE values (by updatedTime)
+		and, if there are more, the URL of the next page in nextPage.'''
+
+		values.sort(key=lambda value: value['updatedTime'])
+		end = min(len(values), CHANGED_WORKLOGS_PAGE_SIZE)
+		# the next page starts after until: the values updated at the same time go in this one
+		while 0 < end < len(values) and values[end]['updatedTime'] == values[end - 1]['updatedTime']:
+			end += 1
+		page = values[:end]
+		until = page[-1]['updatedTime'] if page else since
+		response = {'values': page, 'since': since, 'until': until, 'lastPage': end == len(values)}
+		if end < len(values):
+			response['nextPage'] = 'http://' + handler.headers['Host'] + path + '?since=' + str(until)
+		return response
+
+	def worklogs_list(self, body):
+		ids = set(str(worklog_id) for worklog_id in body.get('ids', [])[:1000])
+		return [worklog for worklog in self.iter_all_worklogs() if worklog['id'] in ids]
+
+
+class FakeSpreadsheet:
+	''' Google Sheets stand-in with the methods of gspread's Spreadsheet used
+	by load_siglo_report (fetch_sheet_metadata, batch_update and
+	values_batch_update). Keeps the values of each tab in memory and counts
+	the requests and bytes received.'''
+
+	def __init__(self, script_version, tabs=('Índice', 'JIRADATA', 'TASKSDATA', 'Errores'), latency=0):
+		self.latency = latency
+		self.tabs = {} # title -> {'sheetId': ..., 'rows': [...], 'cells': {...}}
+		for tab in tabs:
+			self.add_tab(tab)
+		self.tabs['Índice']['cells']['C22'] = script_version
+		self.stats = {}
+
+	def add_tab(self, title):
+		# not reused even if a tab was removed
+		sheet_id = max((tab['sheetId'] for tab in self.tabs.values()), default=-1) + 1
+		# rowCount: rows of the grid (header included)
+		self.tabs[title] = {'sheetId': sheet_id, 'header': [], 'rows': [], 'cells': {}, 'rowCount': 1000}
+		return sheet_id
+
+	def count(self, method, body):
+		if self.latency:
+			time.sleep(self.latency)
+		method_stats = self.stats.setdefault(method, {'requests': 0, 'bytes': 0})
+		method_stats['requests'] += 1
+		method_stats['bytes'] += len(json.dumps(body))
+
+	def tab_by_id(self, sheet_id):
+		for tab in self.tabs.values():
+			if tab['sheetId'] == sheet_id:
+				return tab
+
+	def fetch_sheet_metadata(self, params=None):
+		self.count('fetch_sheet_metadata', params)
+		params = params or {}
+		ranges = params.get('ranges', [])
+		if isinstance(ranges, str):
+			ranges = [ranges]
+
+		sheets = []
+		for title, tab in self.tabs.items():
+			sheet = {'properties': {'sheetId': tab['sheetId'], 'title': title,
+				'gridProperties': {'rowCount': tab['rowCount']}}}
+			for range_name in ranges:
+				if range_name.split('!')[0] == title and '!' in range_name:
+					value = tab['cells'].get(range_name.split('!')[1])
+					sheet['data'] = [{'rowData': [{'values': [{'formattedValue': value}]}]}]
+			sheets.append(sheet)
+		return {'sheets': sheets, 'namedRanges': []}
+
+	def batch_update(self, body):
+		self.count('batch_update', body)
+		replies = []
+		for request in body['requests']:
+			reply = {}
+			if 'updateSheetProperties' in request:
+				properties = request['updateSheetProperties']['properties']
+				tab = self.tab_by_id(properties['sheetId'])
+				tab['rowCount'] = properties['gridProperties']['rowCount']
+				del tab['rows'][tab['rowCount'] - 1:]
+			elif 'duplicateSheet' in request:
+				source = self.tab_by_id(request['duplicateSheet']['sourceSheetId'])
+				sheet_id = self.add_tab(request['duplicateSheet']['newSheetName'])
+				self.tab_by_id(sheet_id)['rows'] = [list(row) for row in source['rows']]
+				self.tab_by_id(sheet_id)['rowCount'] = source['rowCount']
+				reply = {'duplicateSheet': {'properties': {'sheetId': sheet_id}}}
+			elif 'addSheet' in request:
+				sheet_id = self.add_tab(request['addSheet']['properties']['title'])
+				reply = {'addSheet': {'properties': {'sheetId': sheet_id}}}
+			replies.append(reply)
+		return {'replies': replies}
+
+	def values_batch_update(self, body=None):
+		self.count('values_batch_update', body)
+		for value_range in body['data']:
+			title, cell = value_range['range'].split('!')
+			tab = self.tabs[title]
+			column = re.match(r'[A-Z]+', cell).group(0)
+			row_number = int(cell[len(column):])
+			if column != 'A':
+				tab['cells'][cell] = value_range['values'][0][0]
+				continue
+			if row_number == 1:
+				tab['header'] = list(value_range['values'][0])
+				continue
+			rows = tab['rows']
+			first = row_number - 2 # the header row is kept apart
+			while len(rows) < first + len(value_range['values']):
+				rows.append([])
+			for i, row in enumerate(value_range['values']):
+				rows[first + i] = list(row)
+			# writing past the last row adds rows to the grid
+			tab['rowCount'] = max(tab['rowCount'], len(rows) + 1)
+
+	def get_rows(self, title):
+		''' Returns the data rows of a tab without trailing blank cells.'''
+
+		rows = []
+		for row in self.tabs[title]['rows']:
+			row = list(row)
+			while row and row[-1] == '':
+				row.pop()
+			rows.append(row)
+		return rows
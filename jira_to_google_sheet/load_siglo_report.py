@@ -1,6 +1,7 @@
 # loads data from Jira (via REST API) to Google Sheet report
 # uses Python3
 # python libraries required: gspread oauth2client xlrd
+# optional python library: ijson (parses Jira's responses while they are downloaded)
 
 # author: Paco Abato - pacoabato@gmail.com
 #    This program is free software: you can redistribute it and/or modify
@@ -16,16 +17,39 @@
 #    You should have received a copy of the GNU General Public License
 #    along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
-# To work with google sheets
-import gspread
-# To authenticate in google sheets
-from oauth2client.service_account import ServiceAccountCredentials
+# gspread (to work with google sheets) and oauth2client (to authenticate in
+# google sheets) are imported when the sheet is opened (see open_google_sheet)
 
 from datetime import datetime
 import json
-import requests
+# requests is imported when the first session to Jira is created (see get_jira_session)
 import base64
 from string import Template
+from concurrent.futures import ThreadPoolExecutor, Future
+from collections import deque, namedtuple
+import itertools
+import threading
+import time
+import sqlite3
+import argparse
+import traceback
+import hashlib
+import os
+import re
+import contextlib
+import functools
+import operator
+import sys
+from datetime import date
+from datetime import timedelta
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import hmac
+
+try:
+	import ijson
+except ImportError:
+	ijson = None
 
 
 SCRIPT_VERSION = 'v3.11 - 20190629'
@@ -37,254 +61,1036 @@ BASE_DIR = '/media/report_files/'
 # Google's credentials file
 CLIENT_SECRET_FILE = 'client_secret.json'
 
+# Last access token obtained from Google (reused until it expires)
+GOOGLE_TOKEN_FILE = 'google_token.json'
+
 JIRA_CREDENTIALS_FILE = 'jira_credentials.json'
 
 CONFIG_FILE = 'config.json'
-# The team key is used to determine if all the people that worked in an issue were from the team
 
-URL_FILTER_ISSUES = Template('https://domain.com/jira/rest/api/2/filter/$filter_id')
-URL_WORKLOG_TEMPLATE = Template('https://domain.com/jira/rest/api/2/issue/$issue_id/worklog/')
-URL_ONE_ISSUE = Template('https://domain.com/jira/rest/api/2/issue/$issue_id/')
+# What was last written to each tab of a report (used by the differential upload)
+SHEET_SNAPSHOT_FILE = Template('sheet_snapshot_$report.json')
+
+# Local copy of the filter's issues and worklogs used by the incremental sync
+JIRA_STORE_FILE = Template('jira_store_$filter_id.db')
+
+# Fix versions of the parent issues that are not in the filters of the reports
+PARENT_CACHE_FILE = 'jira_parents.db'
+# The team key is used to determine if all the people that worked in an issue were from the team
 
+# $jira_url is replaced by conf_jira_url
+URL_FILTER_ISSUES = Template('$jira_url/rest/api/2/filter/$filter_id')
+URL_WORKLOG_TEMPLATE = Template('$jira_url/rest/api/2/issue/$issue_id/worklog/')
+URL_ONE_ISSUE = Template('$jira_url/rest/api/2/issue/$issue_id/')
+URL_SEARCH = Template('$jira_url/rest/api/2/search')
+URL_WORKLOG_UPDATED = Template('$jira_url/rest/api/2/worklog/updated?since=$since')
+URL_WORKLOG_DELETED = Template('$jira_url/rest/api/2/worklog/deleted?since=$since')
+URL_WORKLOG_LIST = Template('$jira_url/rest/api/2/worklog/list')
+URL_BROWSE_ISSUE = Template('$jira_url/browse/$issue_key')
+
+# used only for the reports without googleSheetKey
 GOOGLE_SHEET_NAME = "Google Sheet's Name"
 
+# a cached access token is not used if it expires in less than this
+GOOGLE_TOKEN_MARGIN = timedelta(minutes=5)
+
 # tabs in google sheet
 TAB_JIRADATA = 'JIRADATA'
 TAB_TASKSDATA = 'TASKSDATA'
 TAB_ERRORES = 'Errores'
-
-NUM_ROWS_TO_INSERT = 5000
-
-# if the assigned person's spentTime in the issue represents lower percentage than
-# this value the issue is considered as shared
-conf_percentage_shared_issue = 0.95
-
-# the ID of the filter in Jira that provides the tasks to be analyzed
-conf_filter_id = 123456
-conf_team = []
+TAB_INDICE = 'Índice'
+
+# tabs with the hours of the worklogs added up (see HoursAggregator), created
+# if they don't exist, and their headers
+TAB_HOURS_PERSON_MONTH = 'HORAS_PERSONA_MES'
+TAB_HOURS_FIX_VERSION = 'HORAS_VERSION'
+TAB_HOURS_PROJECT_TYPE = 'HORAS_PROYECTO_TIPO'
+TAB_HOURS_SHARED = 'HORAS_COMPARTIDAS'
+AGGREGATE_TABS = {
+	TAB_HOURS_PERSON_MONTH: ['Persona', 'Mes', 'Horas', 'Imputaciones'],
+	TAB_HOURS_FIX_VERSION: ['Versión', 'Tareas', 'Horas', 'Imputaciones'],
+	TAB_HOURS_PROJECT_TYPE: ['Proyecto', 'Tipo', 'Tareas', 'Horas', 'Imputaciones'],
+	TAB_HOURS_SHARED: ['Compartida', 'Exclusiva del equipo', 'Tareas', 'Horas', 'Imputaciones'],
+}
+
+# path where Jira's webhook sends its events (see ReportService), the
+# biggest event accepted and the events that change the report
+WEBHOOK_PATH = '/jira-webhook'
+WEBHOOK_MAX_BYTES = 1024 * 1024
+WEBHOOK_ISSUE_EVENTS = ('jira:issue_created', 'jira:issue_updated', 'jira:issue_deleted')
+WEBHOOK_WORKLOG_EVENTS = ('worklog_created', 'worklog_updated', 'worklog_deleted')
+
+# cells of the Índice tab with the script version required by the report and
+# with the date and person of the last load
+CELL_SCRIPT_VERSION = 'C22'
+CELL_LAST_UPDATE = 'E4'
+
+# tabs with more rows than conf_max_rows_per_tab are continued in new tabs named like this
+TAB_SHARD_NAME = Template('${tab}_$number')
+
+# Google recommends requests to Sheets API not bigger than 2 MB
+SHEETS_MAX_PAYLOAD_BYTES = 2 * 1024 * 1024
+# errors from Sheets API that are retried
+SHEETS_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+JIRA_MAX_PAGE_SIZE = 1000
+
+# issue's fields read by the report (the rest are not downloaded)
+ISSUE_FIELDS = ['summary', 'fixVersions', 'assignee', 'status', 'created', 'updated',
+	'resolutiondate', 'customfield_15190', 'project', 'issuetype',
+	'timeoriginalestimate', 'timeestimate', 'timespent',
+	'aggregatetimeoriginalestimate', 'aggregatetimeestimate', 'aggregatetimespent',
+	'parent']
+
+# upper bounds (in seconds) of the buckets of the request latency histograms
+METRICS_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+# prefix of the metrics written to the Prometheus file
+METRICS_PREFIX = 'siglo_report_'
+
+# seconds to wait for Jira before giving up a request
+JIRA_TIMEOUT = 60
+# responses with these status codes are retried (429 and 503 honour the Retry-After header)
+JIRA_RETRY_STATUS = (429, 500, 502, 503, 504)
+
+# the incremental sync asks again for issues updated this time before the
+# last sync, in case some issue changed while it was being downloaded
+INCREMENTAL_SYNC_MARGIN = timedelta(minutes=15)
+# issues requested by id in each search of the incremental sync
+ISSUES_BY_ID_CHUNK = 100
+# issues read from the local store at once (SQLite limits the parameters of a query)
+STORE_READ_PAGE_SIZE = 500
+# parent issue's fields read to check the fix version of its sub-tasks
+# (the summary of the parent already comes with the sub-task)
+PARENT_FIELDS = ['fixVersions']
+# maximum number of worklogs that can be asked for in one request to worklog/list
+WORKLOG_LIST_MAX_IDS = 1000
+
+# Records kept while a report is analyzed (tuples: smaller than dicts and lists,
+# and uploaded as rows as they are). Repeated strings (names, project, status,
+# fix version...) are interned so all the records share one copy of them.
+# worklog's info used by the report (see convert_worklog)
+Worklog = namedtuple('Worklog', ['id', 'author', 'author_username', 'timeSpent', 'comment', 'started'])
+# row of the JIRADATA tab (one per worklog)
+JiraDataRecord = namedtuple('JiraDataRecord', ['project', 'issue_type', 'key', 'title',
+	'time_original_estimate', 'time_estimate', 'time_spent',
+	'started', 'author', 'worklog_time_spent', 'comment', 'is_shared', 'is_team_exclusive'])
+# date of a Jira date-string (see parse_jira_date) as shown in the report ('01/04/2019'),
+# its month ('2019/04') and its number of day (date.toordinal) to compare it with others
+JiraDate = namedtuple('JiraDate', ['day', 'month', 'ordinal'])
+# issue's info checked by the validation rules (see ValidationRule)
+IssueRecord = namedtuple('IssueRecord', ['id', 'key', 'summary', 'assigned_to', 'link', 'status',
+	'fix_version', 'is_subtask', 'parent_id', 'parent_key', 'parent_summary',
+	'time_original_estimate', 'time_estimate', 'time_spent', 'deviated',
+	'updated', 'days_since_update', 'is_np', 'parent_fix_version', 'different_version'])
+# fields of IssueRecord only known once every issue has been read (the last ones)
+ISSUE_FIELDS_AFTER_LOAD = ('parent_fix_version', 'different_version')
+# days whose JiraDate is kept by parse_jira_day
+JIRA_DATE_CACHE_SIZE = 4096
+# result of the analysis of an issue (see analyze_issue): its rows of JIRADATA
+# and TASKSDATA, the record checked by the validation rules and its project
+# and type (to add up its hours, see HoursAggregator)
+IssueAnalysis = namedtuple('IssueAnalysis', ['jiradata_records', 'task_record', 'issue_record', 'project_name', 'issue_type'])
+# row of the TASKSDATA tab (one per issue)
+TaskRecord = namedtuple('TaskRecord', ['key', 'summary', 'assigned_to',
+	'time_original_estimate', 'time_estimate', 'time_spent',
+	'fix_version', 'status', 'created', 'updated', 'resolved', 'resolved_month',
+	'incidence_type', 'parent_summary', 'link', 'is_shared', 'is_team_exclusive'])
+
+# operators of the conditions of the validation rules (value of the issue's field, rule's value)
+RULE_OPERATORS = {
+	'=': operator.eq,
+	'!=': operator.ne,
+	'<': operator.lt,
+	'<=': operator.le,
+	'>': operator.gt,
+	'>=': operator.ge,
+	'in': lambda value, values: value in values,
+	'notIn': lambda value, values: value not in values,
+	'startsWith': lambda value, prefix: value.startswith(prefix),
+}
+
+OPEN_STATUSES = ['Open', 'In progress', 'Reopened', 'Paused', 'Blocked']
+# doesn't take into account 'Rejected' wich can have any condition and it doesn't matter
+CLOSED_STATUSES = ['Resolved', 'Closed']
+
+# checks of the issues written to the Errores tab, in this order (see ValidationRule)
+VALIDATION_RULES = [
+	{'name': 'different_version',
+		'title': '** Tareas con distinta versión que su tarea padre.',
+		'headers': ['Tarea', 'Padre', 'Descripción Tarea', 'Descripción Padre', 'Asignada a', 'Enlace Tarea'],
+		'columns': ['key', 'parent_key', 'summary', 'parent_summary', 'assigned_to', 'link'],
+		'when': {'different_version': True}},
+	{'name': 'open_no_remaining',
+		'title': '** Tareas abiertas sin remaining (ETC).',
+		'headers': ['Tarea', 'Descripción', 'Asignada a', 'Enlace'],
+		'columns': ['key', 'summary', 'assigned_to', 'link'],
+		'when': {'is_subtask': True, 'status': OPEN_STATUSES, 'time_estimate': {'<=': 0}}},
+	{'name': 'open_old_updated',
+		'title': '** Tareas abiertas actualizadas por última vez hace más de un mes.',
+		'headers': ['Tarea', 'Descripción', 'Asignada a', 'Última actualización', 'Enlace'],
+		'columns': ['key', 'summary', 'assigned_to', 'updated', 'link'],
+		'when': {'is_subtask': True, 'status': OPEN_STATUSES, 'days_since_update': {'>': 30}}},
+	{'name': 'closed_with_remaining',
+		'title': '** Tareas cerradas con remaining (ETC).',
+		'headers': ['Tarea', 'Descripción', 'Asignada a', 'Enlace'],
+		'columns': ['key', 'summary', 'assigned_to', 'link'],
+		'when': {'is_subtask': True, 'status': CLOSED_STATUSES, 'time_estimate': {'>': 0}}},
+	{'name': 'closed_with_zero_spent',
+		'title': '** Tareas cerradas con tiempo imputado cero.',
+		'headers': ['Tarea', 'Descripción', 'Asignada a', 'Enlace'],
+		'columns': ['key', 'summary', 'assigned_to', 'link'],
+		'when': {'is_subtask': True, 'status': CLOSED_STATUSES, 'time_spent': 0}},
+	{'name': 'issues_deviated',
+		'title': '** Tareas desviadas (Estimado < Imputado + ETC).',
+		'headers': ['Tarea', 'Descripción', 'Asignada a', 'Enlace'],
+		'columns': ['key', 'summary', 'assigned_to', 'link'],
+		'when': {'deviated': True}},
+	{'name': 'np_no_estimate',
+		'title': '** Cambios de alcance sin estimación original.',
+		'headers': ['Tarea', 'Descripción', 'Asignada a', 'Enlace'],
+		'columns': ['key', 'summary', 'assigned_to', 'link'],
+		'when': {'is_np': True, 'time_original_estimate': 0}},
+	{'name': 'parent_with_spent',
+		'title': '** Tareas padre con tiempo imputado.',
+		'headers': ['Tarea', 'Descripción', 'Asignada a', 'Enlace'],
+		'columns': ['key', 'summary', 'assigned_to', 'link'],
+		'when': {'is_subtask': False, 'time_spent': {'>': 0}}},
+]
+
+# base URL of Jira
+conf_jira_url = 'https://domain.com/jira'
+
+# the settings of each report (filter, team...) are in a ReportConfig
+
+# maximum number of reports loaded at the same time by a batch (see run_main)
+conf_reports_concurrency = 4
+
+# rows uploaded to Google Sheet in each request
+conf_upload_chunk_rows = 2000
+# if True, only the rows that changed since the last load are uploaded
+conf_differential_upload = False
+# maximum number of requests per minute sent to Sheets API (its write quota per user; 0 means no limit)
+conf_sheets_requests_per_minute = 60
+# maximum number of data rows in a tab (JIRADATA is split in several tabs if needed)
+conf_max_rows_per_tab = 200000
+# tabs with pivot tables whose source range must follow the size of the data tabs
+conf_pivot_tabs = []
+
+# maximum number of worklog requests sent to Jira at the same time
+conf_worklogs_concurrency = 8
+
+# number of issues requested per search page (Jira doesn't allow more than JIRA_MAX_PAGE_SIZE)
+conf_page_size = 100
+# if True, after the first page all the other pages are downloaded at the same time
+conf_parallel_pages = False
+conf_pages_concurrency = 4
+
+# fields downloaded for each issue besides ISSUE_FIELDS
+conf_extra_fields = []
+
+# retries for failed Jira requests (waiting 1s, 2s, 4s... between them)
+conf_max_retries = 5
+# maximum number of requests per second sent to Jira (0 means no limit)
+conf_requests_per_second = 20
+
+# if True, issues and worklogs are kept in a local store and only the
+# issues updated since the last run are downloaded
+conf_incremental_sync = False
+
+# how worklogs are downloaded:
+# 'issue': one request per issue
+# 'bulk': the IDs of the worklogs changed since the last sync are asked for to Jira and
+# then the worklogs are downloaded in batches of WORKLOG_LIST_MAX_IDS. Only with the
+# incremental sync (the first sync downloads them by issue): Jira lists the changed
+# worklogs of the whole instance, not only the filter's
+conf_worklog_backend = 'issue'
+
+# files (relative to BASE_DIR) where the measures of the run are written
+# in JSON and in the Prometheus textfile collector format (empty to not write them).
+# The Prometheus export is opt-in: set prometheusFile (like "report_metrics.prom")
+# in config.json to write it
+conf_metrics_file = 'report_metrics.json'
+conf_prometheus_file = ''
+
+# if True the AGGREGATE_TABS are written (small tables for the report's charts
+# and summaries instead of pivot tables over every row of JIRADATA), and
+# created in the report if they don't exist
+conf_aggregate_tabs = False
+
+# names of the VALIDATION_RULES that are not checked
+conf_disabled_rules = []
+# validation rules added to VALIDATION_RULES (or replacing the one with the same name)
+conf_custom_rules = []
+# how the validation rules are evaluated: 'row' (issue by issue) or
+# 'columnar' (condition by condition over a page of issues, see ValidationEngine)
+conf_rule_evaluation = 'row'
+
+# hours the fix versions of the parent issues that are not in the filter
+# are kept in PARENT_CACHE_FILE before being downloaded again
+conf_parent_cache_hours = 168
+
+# service mode (see ReportService): address where Jira's webhook is listened
+# and secret expected in its URL (?secret=..., empty to not check it)
+conf_service_host = '127.0.0.1'
+conf_service_port = 8090
+conf_webhook_secret = ''
+# seconds without events before the changed issues are loaded, and maximum
+# seconds an event waits while more of them arrive
+conf_service_debounce_seconds = 10
+conf_service_max_delay_seconds = 60
+# minutes between complete loads (they catch the events that were missed)
+conf_service_sweep_minutes = 60
+
+# HTTP sessions to Jira (one per auth code) and the rate limiter shared by all of them
+jira_sessions = {}
+jira_sessions_lock = threading.Lock()
+jira_rate_limiter = None
+
+# worklogs downloaded during a batch of several reports (see JiraCache)
+jira_cache = None
+# see get_jira_store_lock
+jira_store_locks = {}
+jira_store_locks_lock = threading.Lock()
+
+# times of the last requests to Sheets API (the quota is shared by all the reports)
+sheets_request_times = deque()
+sheets_quota_lock = threading.Lock()
 
 # In https://console.developers.google.com/ Google Sheets API and Google Drive API must be both of them enabled
 
 # This is the scope to use:
 scope = ['https://spreadsheets.google.com/feeds', 'https://www.googleapis.com/auth/drive']
 
-creds = ServiceAccountCredentials.from_json_keyfile_name(BASE_DIR + CLIENT_SECRET_FILE, scope)
-client = gspread.authorize(creds)
-google_sheet = client.open(GOOGLE_SHEET_NAME)
+# client authenticated the first time it is needed and the sheets opened with
+# it, by key (or by GOOGLE_SHEET_NAME). See open_google_sheet
+google_client = None
+google_sheets = {}
+google_lock = threading.Lock()
+
+def open_google_sheet(sheet_key):
+	''' Returns the Google Sheet with the given key (or the one named
+	GOOGLE_SHEET_NAME if sheet_key is empty), authenticating the first time.
+	The access token is cached in GOOGLE_TOKEN_FILE so the next runs don't
+	ask Google for a new one until it expires.'''
+
+	global google_client
+	sheet_key = sheet_key or GOOGLE_SHEET_NAME
+	with google_lock:
+		if sheet_key in google_sheets:
+			return google_sheets[sheet_key]
+
+		creds = None
+		if google_client is None:
+			import gspread
+			from oauth2client.service_account import ServiceAccountCredentials
+
+			creds = ServiceAccountCredentials.from_json_keyfile_name(BASE_DIR + CLIENT_SECRET_FILE, scope)
+			cached_token = read_google_token(creds)
+			set_google_token(creds, cached_token)
+			google_client = gspread.authorize(creds)
+			# gspread 6 converts the credentials to google-auth ones
+			if hasattr(google_client, 'http_client'):
+				creds = google_client.http_client.auth
+				set_google_token(creds, cached_token)
+
+		if sheet_key == GOOGLE_SHEET_NAME:
+			google_sheets[sheet_key] = google_client.open(GOOGLE_SHEET_NAME)
+		else:
+			google_sheets[sheet_key] = google_client.open_by_key(sheet_key)
+
+		if creds is not None:
+			save_google_token(creds)
+		return google_sheets[sheet_key]
+
+def get_token_attributes(creds):
+	''' Returns the names of the attributes of creds with the access
+	token and its expiry (they differ in oauth2client and google-auth).'''
+
+	if hasattr(creds, 'token_expiry'):
+		return 'access_token', 'token_expiry'
+	return 'token', 'expiry'
+
+def read_google_token(creds):
+	''' Returns the token cached for the account of creds as (token, expiry)
+	or None if there is none or it's about to expire.'''
+
+	try:
+		with open(BASE_DIR + GOOGLE_TOKEN_FILE) as f:
+			cached = json.load(f)
+		# expiry is in UTC, as in the credentials
+		expiry = datetime.strptime(cached['expiry'], '%Y-%m-%dT%H:%M:%S')
+		token = cached['token']
+		account = cached.get('account')
+	except (OSError, ValueError, KeyError, TypeError):
+		# a damaged cache is ignored (a new token is asked for)
+		return None
+
+	if account != creds.service_account_email or expiry - datetime.utcnow() < GOOGLE_TOKEN_MARGIN:
+		return None
+	return token, expiry
+
+def set_google_token(creds, cached_token):
+	if cached_token:
+		token_attribute, expiry_attribute = get_token_attributes(creds)
+		setattr(creds, token_attribute, cached_token[0])
+		setattr(creds, expiry_attribute, cached_token[1])
+
+def save_google_token(creds):
+	''' Caches the access token of creds (only the owner can read the file).'''
+
+	token_attribute, expiry_attribute = get_token_attributes(creds)
+	token = getattr(creds, token_attribute, None)
+	expiry = getattr(creds, expiry_attribute, None)
+	if not token or not expiry:
+		return
+
+	cached = {
+		'account': creds.service_account_email,
+		'token': token,
+		'expiry': expiry.strftime('%Y-%m-%dT%H:%M:%S')}
+	with open(os.open(BASE_DIR + GOOGLE_TOKEN_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+		json.dump(cached, f)
+
+def run_main(full_refresh=False, reports_file=None, changed_ids=None, analysis_caches=None):
+	''' Loads the report configured in config.json or, if reports_file is
+	given, every report defined in it (see load_reports), up to
+	conf_reports_concurrency at the same time. The reports of a batch share
+	the connections to Jira, the Google client and the worklogs downloaded
+	(see JiraCache).
+	If full_refresh is True the incremental sync discards its local store
+	and downloads everything again, and every row is uploaded (even with
+	differential upload).
+	changed_ids and analysis_caches (a dict with the analysis_cache of each
+	report, filled as they are loaded) are given by ReportService (see load_report).
+	The measures of the run (see RunMetrics) are written at the end,
+	even if it failed.'''
+
+	global metrics
+	global jira_cache
+	metrics = RunMetrics()
+	try:
+		print('Loading report info...')
+		with metrics.phase('config'):
+			creds = read_credentials()
+
+			if not check_credentials(creds):
+				print('You must include your credentials into file ' + JIRA_CREDENTIALS_FILE)
+
+			default_report = report_from_config(load_config())
+			if reports_file:
+				reports = load_reports(reports_file, default_report)
+			else:
+				reports = [default_report]
+
+		def run(report):
+			analysis_cache = analysis_caches.setdefault(report.name, {}) if analysis_caches is not None else None
+			return run_report(auth, creds, report, full_refresh, changed_ids, analysis_cache)
+
+		auth = get_auth_code(creds['user_name'], creds['password'])
+		if len(reports) == 1:
+			results = [run(reports[0])]
+		else:
+			jira_cache = JiraCache()
+			with ThreadPoolExecutor(max_workers=max(1, conf_reports_concurrency)) as executor:
+				results = list(executor.map(run, reports))
+
+		metrics.success = all(results)
+	finally:
+		jira_cache = None
+		metrics.finish()
+		export_metrics(metrics)
+
+	failed = [report.name for report, result in zip(reports, results) if result is None]
+	if failed:
+		raise BaseException('Could not load the reports: ' + ', '.join(failed))
+
+def run_report(auth_code, creds, report, full_refresh, changed_ids=None, analysis_cache=None):
+	''' Loads a report (see load_report). Returns whether it was loaded
+	or None if it failed. The errors are printed, not raised, so the other
+	reports of a batch are loaded anyway.'''
+
+	start = time.perf_counter()
+	loaded = None
+	try:
+		# the time not spent in other phases is spent analyzing
+		with metrics.phase('analysis'):
+			loaded = load_report(auth_code, creds, report, full_refresh, changed_ids, analysis_cache)
+	except BaseException as e:
+		# interrupts stop the run (the script's own errors are BaseException too)
+		if isinstance(e, (KeyboardInterrupt, SystemExit)):
+			raise
+		print('Report', report.name, 'failed:')
+		traceback.print_exc()
+	metrics.record_report(report.name, loaded, time.perf_counter() - start)
+	return loaded
+
+class ReportService:
+	''' Keeps the reports up to date listening to Jira's webhook: the issues
+	of the events (or of their worklogs) are collected and, when no event
+	arrives for conf_service_debounce_seconds (or the first one waited
+	conf_service_max_delay_seconds), only those issues are downloaded and
+	analyzed again (see load_report) and only the rows that changed are
+	uploaded. Every conf_service_sweep_minutes a complete load catches the
+	events that were missed.
+	Needs the incremental sync and the differential upload.'''
+
+	def __init__(self, reports_file=None):
+		self.reports_file = reports_file
+		self.condition = threading.Condition()
+		self.pending_ids = set()
+		self.first_event = None
+		self.last_event = None
+		# the IssueAnalysis of each report's issues (see load_report)
+		self.analysis_caches = {}
+		self.analysis_day = None
+		self.server = None
+
+	def start(self):
+		load_config()
+		if not conf_incremental_sync or not conf_differential_upload:
+			print('The service mode needs incrementalSync and differentialUpload in ' + CONFIG_FILE)
+			raise BaseException('Service mode without incremental sync or differential upload')
+
+		self.server = ThreadingHTTPServer((conf_service_host, conf_service_port), self.get_handler())
+		self.server.daemon_threads = True
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		print('Listening to Jira events in http://' + conf_service_host + ':' +
+			str(self.server.server_address[1]) + WEBHOOK_PATH)
+
+	def stop(self):
+		if self.server is not None:
+			self.server.shutdown()
+			self.server.server_close()
+			self.server = None
+
+	def serve_forever(self):
+		''' Loads every issue and then the changed ones until interrupted.'''
+
+		self.start()
+		try:
+			next_sweep = time.monotonic()
+			while True:
+				if time.monotonic() >= next_sweep:
+					self.load(None)
+					next_sweep = time.monotonic() + conf_service_sweep_minutes * 60
+
+				issue_ids = self.wait_for_changes(next_sweep)
+				if issue_ids:
+					self.load(issue_ids)
+		finally:
+			self.stop()
+
+	def add_event(self, issue_id):
+		with self.condition:
+			now = time.monotonic()
+			if not self.pending_ids:
+				self.first_event = now
+			self.pending_ids.add(issue_id)
+			self.last_event = now
+			self.condition.notify()
+
+	def wait_for_changes(self, deadline):
+		''' Waits until the pending issues must be loaded (see the class) or
+		until deadline (time.monotonic). Returns the issues (maybe none).'''
+
+		with self.condition:
+			while True:
+				now = time.monotonic()
+				if self.pending_ids:
+					due = min(self.last_event + conf_service_debounce_seconds,
+						self.first_event + conf_service_max_delay_seconds)
+					if now >= due:
+						issue_ids = self.pending_ids
+						self.pending_ids = set()
+						return issue_ids
+					deadline = min(deadline, due)
+				if now >= deadline:
+					return None
+				self.condition.wait(deadline - now)
+
+	def load(self, issue_ids):
+		''' Loads the reports: every issue if issue_ids is None or only
+		those issues. Errors are printed (the next sweep loads everything).'''
+
+		# the analysis depends on the day (see analyze_issue)
+		if self.analysis_day != date.today() or issue_ids is None:
+			self.analysis_caches.clear()
+			self.analysis_day = date.today()
+
+		if issue_ids is None:
+			print('Loading every issue...')
+		else:
+			print('Loading the issues changed:', ', '.join(sorted(issue_ids)))
+		try:
+			run_main(reports_file=self.reports_file, changed_ids=issue_ids,
+				analysis_caches=self.analysis_caches)
+		except BaseException as e:
+			if isinstance(e, (KeyboardInterrupt, SystemExit)):
+				raise
+			traceback.print_exc()
+			# the analysis of a report that failed may be incomplete
+			self.analysis_caches.clear()
+
+	def get_handler(self):
+		service = self
+
+		class WebhookHandler(BaseHTTPRequestHandler):
+
+			def do_POST(self):
+				url = urlsplit(self.path)
+				if url.path != WEBHOOK_PATH:
+					self.send_error(404)
+					return
+				if conf_webhook_secret:
+					secret = dict(parse_qsl(url.query)).get('secret', '')
+					if not hmac.compare_digest(secret.encode(), conf_webhook_secret.encode()):
+						self.send_error(403)
+						return
+
+				try:
+					length = int(self.headers.get('Content-Length', 0))
+				except ValueError:
+					length = -1
+				if length < 0:
+					self.send_error(400)
+					return
+				if length > WEBHOOK_MAX_BYTES:
+					self.send_error(413)
+					return
+				try:
+					event = json.loads(self.rfile.read(length))
+				except ValueError:
+					self.send_error(400)
+					return
+
+				issue_id = get_event_issue_id(event)
+				if issue_id is not None:
+					service.add_event(issue_id)
+				self.send_response(204)
+				self.end_headers()
+
+			def log_message(self, format, *args):
+				pass
+
+		return WebhookHandler
+
+
+def get_event_issue_id(event):
+	''' Returns the ID of the issue changed by an event of Jira's webhook
+	or None if the event doesn't change the report.'''
+
+	if not isinstance(event, dict):
+		return None
+	name = event.get('webhookEvent')
+	if name in WEBHOOK_ISSUE_EVENTS:
+		issue_id = (event.get('issue') or {}).get('id')
+	elif name in WEBHOOK_WORKLOG_EVENTS:
+		issue_id = (event.get('worklog') or {}).get('issueId')
+	else:
+		return None
+	return None if issue_id is None else str(issue_id)
 
-def run_main():
-	print('Checking script version validity...')
-	script_ver = google_sheet.worksheet('Índice').acell('C22').value
+
+def load_report(auth_code, creds, report, full_refresh, changed_ids=None, analysis_cache=None):
+	''' Loads the report defined by report (a ReportConfig).
+	Returns whether the report was loaded.
+	If analysis_cache (a dict) is given the IssueAnalysis of every issue is
+	kept in it and the issues already there are not analyzed again, except
+	the ones in changed_ids (the only ones synchronized with the incremental
+	sync, see iter_report_pages).'''
+
+	print('Checking script version validity of report', report.name + '...')
+	sheet_writer = SheetWriter(open_google_sheet(report.google_sheet_key), report.name)
+	script_ver = sheet_writer.read_metadata(TAB_INDICE + '!' + CELL_SCRIPT_VERSION)
 	if script_ver != SCRIPT_VERSION:
 		print('Script version', SCRIPT_VERSION, 'not valid. It should be:', script_ver)
-		return
-
-	print('Loading report info...')
-	creds = read_credentials()
+		return False
 
-	if not check_credentials(creds):
-		print('You must include your credentials into file ' + JIRA_CREDENTIALS_FILE)
-	
-	load_config()
+	skip_ids = frozenset()
+	if analysis_cache is not None:
+		for issue_id in changed_ids or []:
+			analysis_cache.pop(issue_id, None)
+		# the ones read anyway (see iter_report_pages) are analyzed again
+		skip_ids = frozenset(analysis_cache)
 
-	auth = get_auth_code(creds['user_name'], creds['password'])
-	issues = find_issues(auth)
+	pages = iter_report_pages(auth_code, report, full_refresh, changed_ids, skip_ids)
+	page = next(pages, None)
 	
-	if len(issues) == 0:
-		return
+	if page is None or len(page[0]) == 0:
+		return page is not None
 
-	dict_issues_key_summary = {}
-	jiradata = []
-	tasks_data = []
-	dict_issue_fix_version = {}
-
-	# issues with different fix version than its parents
-	errors_different_version = []
-	errors_different_version.append(['** Tareas con distinta versión que su tarea padre.'])
-	errors_different_version.append(['Tarea', 'Padre', 'Descripción Tarea', 'Descripción Padre', 'Asignada a', 'Enlace Tarea'])
-
-	# open issues with no remaining time
-	errors_open_no_remaining = []
-	errors_open_no_remaining.append(['** Tareas abiertas sin remaining (ETC).'])
-	errors_open_no_remaining.append(['Tarea', 'Descripción', 'Asignada a', 'Enlace'])
-
-	# open issues with last upadte more than one month ago
-	errors_open_old_updated = []
-	errors_open_old_updated.append(['** Tareas abiertas actualizadas por última vez hace más de un mes.'])
-	errors_open_old_updated.append(['Tarea', 'Descripción', 'Asignada a', 'Última actualización', 'Enlace'])
-
-	# closed issues with remaining time
-	errors_closed_with_remaining = []
-	errors_closed_with_remaining.append(['** Tareas cerradas con remaining (ETC).'])
-	errors_closed_with_remaining.append(['Tarea', 'Descripción', 'Asignada a', 'Enlace'])
-
-	# closed issues with zero spent time
-	errors_closed_with_zero_spent = []
-	errors_closed_with_zero_spent.append(['** Tareas cerradas con tiempo imputado cero.'])
-	errors_closed_with_zero_spent.append(['Tarea', 'Descripción', 'Asignada a', 'Enlace'])
-
-	# issues deviated
-	errors_issues_deviated = []
-	errors_issues_deviated.append(['** Tareas desviadas (Estimado < Imputado + ETC).'])
-	errors_issues_deviated.append(['Tarea', 'Descripción', 'Asignada a', 'Enlace'])
-
-	# "cambios de alcance" with no original estimate
-	errors_np_no_estimate = []
-	errors_np_no_estimate.append(['** Cambios de alcance sin estimación original.'])
-	errors_np_no_estimate.append(['Tarea', 'Descripción', 'Asignada a', 'Enlace'])
-
-	# parent issues with spent time
-	errors_parent_with_spent = []
-	errors_parent_with_spent.append(['** Tareas padre con tiempo imputado.'])
-	errors_parent_with_spent.append(['Tarea', 'Descripción', 'Asignada a', 'Enlace'])
+	validation = ValidationEngine(get_validation_rules(), conf_rule_evaluation == 'columnar')
 
 	print('Analyzing downloaded info...')
 
-	for issue in issues:
-		dict_issue_fix_version[issue['id']] = issue['fields']['fixVersions'][0]['name']
+	# rows are uploaded in chunks while the next pages are analyzed
+	differential = conf_differential_upload and not full_refresh
+	jiradata_writer = ShardedTabWriter(sheet_writer, TAB_JIRADATA, differential)
+	tasks_data_writer = TabWriter(sheet_writer, TAB_TASKSDATA, differential)
+	aggregator = HoursAggregator() if conf_aggregate_tabs else None
 
-	analyzed_issues = 1
+	# fix version of every issue, to check the ones of their sub-tasks
+	dict_issue_fix_version = {}
 
-	for issue in issues:
-		if analyzed_issues % 100 == 0:
-			print(analyzed_issues, 'issues analyzed.')
-		analyzed_issues += 1
-		issue_id = issue['id']
-		issue_key = issue['key']
-		fields = issue['fields']
-		issue_link = 'https://domain.com/jira/browse/' + issue_key # TODO put this URL in a Template constant
-		issue_summary = fields['summary']
-		dict_issues_key_summary[issue_key] = issue_summary
-		issue_fix_version = fields['fixVersions'][0]['name']
-		
-		issue_assigned_to = 'Sin asignar'
-		issue_field_assigned_to = fields['assignee']
-		if issue_field_assigned_to:
-			issue_assigned_to = issue_field_assigned_to['displayName']
-		
-		issue_status = fields['status']['name']
-		issue_created = format_long_date_string(fields['created'], False)
-		issue_updated = format_long_date_string(fields['updated'], False)
-		issue_resolved = format_long_date_string(fields['resolutiondate'], False)
-		issue_resolved_month = format_long_date_string(fields['resolutiondate'], True)
-		issue_incidence_type = ''
-		issue_field_incidence_type = fields['customfield_15190']
-		if issue_field_incidence_type:
-			issue_incidence_type = issue_field_incidence_type['value']
-		issue_id = issue['id']
-		worklogs = find_worklogs(auth, issue_id)
-
-		is_shared = calculate_shared_issue(worklogs, issue_assigned_to)
-		is_team_exclusive = calculate_team_exclusive(worklogs)
-		project_name = fields['project']['name']
-		issue_type = fields['issuetype']['name']
-		issue_title = issue_summary
-		issue_time_original_estimate = to_hours(fields['timeoriginalestimate'])
-		issue_time_estimate = to_hours(fields['timeestimate'])
-		issue_time_spent = to_hours(fields['timespent'])
-		jiradata_base = [project_name, issue_type, 
-			issue_key, issue_title, issue_time_original_estimate,
-			issue_time_estimate, issue_time_spent]
-
-		if len(jiradata) > NUM_ROWS_TO_INSERT:
-			print('Expected maximum number of records (', NUM_ROWS_TO_INSERT, ') exceeded.')
-			print('You should update the dynamic tables indexes in Google Sheet and the constant NUM_ROWS_TO_INSERT in the script.')
-			# TODO should abort loading data?
-
-		issue_parent_summary = ''
-		issue_parent_key = ''
-		parent_fix_version = ''
-		if 'parent' in fields:
-			issue_field_parent = fields['parent']
-			issue_parent_summary = issue_field_parent['fields']['summary']
-			issue_parent_key = issue_field_parent['key']
-			if issue_field_parent['id'] in dict_issue_fix_version:
-				parent_fix_version = dict_issue_fix_version[issue_field_parent['id']]
-		if parent_fix_version and issue_fix_version and parent_fix_version != issue_fix_version:
-			errors_different_version.append([issue_key, issue_parent_key, issue_summary, issue_parent_summary, issue_assigned_to, issue_link])
-		
-		if issue_parent_key:
-			# if issue it's not a parent issue
-
-			if issue_status in ['Open', 'In progress', 'Reopened', 'Paused', 'Blocked']:
-				if issue_time_estimate <= 0:
-					errors_open_no_remaining.append([issue_key, issue_summary, issue_assigned_to, issue_link])
-
-				delta = datetime.today() - datetime.strptime(issue_updated, '%d/%m/%Y')
-				if delta.days > 30:
-					errors_open_old_updated.append([issue_key, issue_summary, issue_assigned_to, issue_updated, issue_link])
-			
-			if issue_status in ['Resolved', 'Closed']: # doesn't take into account 'Rejected' wich can have any condition and it doesn't matter
-				if issue_time_estimate > 0:
-					errors_closed_with_remaining.append([issue_key, issue_summary, issue_assigned_to, issue_link])
-				
-				if issue_time_spent == 0:
-					errors_closed_with_zero_spent.append([issue_key, issue_summary, issue_assigned_to, issue_link])
-			
-			if int(issue_time_original_estimate) < int(issue_time_spent) + int(issue_time_estimate):
-				errors_issues_deviated.append([issue_key, issue_summary, issue_assigned_to, issue_link])
-			
-		else:
-			# if it is a parent issue
-			issue_aggregate_time_original_estimate = fields['aggregatetimeoriginalestimate']
-			issue_aggregate_time_estimate = fields['aggregatetimeestimate']
-			issue_aggregate_time_spent = fields['aggregatetimespent']
-			if issue_aggregate_time_original_estimate and issue_aggregate_time_estimate and issue_aggregate_time_spent \
-				and int(issue_aggregate_time_original_estimate) < int(issue_aggregate_time_spent) + int(issue_aggregate_time_estimate):
-				errors_issues_deviated.append([issue_key, issue_summary, issue_assigned_to, issue_link])
-			
-			if issue_time_spent > 0:
-				errors_parent_with_spent.append([issue_key, issue_summary, issue_assigned_to, issue_link])
-
-		if issue_summary.strip().startswith('NP_') or issue_summary.strip().startswith('NP-'):
-			if not issue_time_original_estimate or issue_time_original_estimate == 0:
-				errors_np_no_estimate.append([issue_key, issue_summary, issue_assigned_to, issue_link])
-
-
-		jiradata.extend(
-			get_jiradata_records(
-				jiradata_base,
-				worklogs,
-				is_shared,
-				is_team_exclusive))
-
-		task_record = [issue_key, issue_summary, issue_assigned_to,
-			issue_time_original_estimate, issue_time_estimate, issue_time_spent,
-			issue_fix_version, issue_status, issue_created, issue_updated, 
-			issue_resolved, issue_resolved_month, issue_incidence_type,
-			issue_parent_summary, issue_link, is_shared, is_team_exclusive]
-
-		tasks_data.append(task_record)
-
-	# end for issue in issues
-
-	len_tasks_data = len(tasks_data)
+	analyzed_issues = 1
+	today = date.today().toordinal()
+
+	while page is not None:
+		issues, dict_issue_worklogs = page
+		page = None
+
+		issue_records = []
+		num_worklogs = 0
+		for issue in issues:
+			if analyzed_issues % 100 == 0:
+				print(analyzed_issues, 'issues analyzed.')
+			analyzed_issues += 1
+			issue_id = issue['id']
+			analysis = None
+			if analysis_cache is not None and 'fields' not in issue:
+				# not read from the store (see iter_store_pages)
+				analysis = analysis_cache.get(issue_id)
+			if analysis is None:
+				analysis = analyze_issue(issue, dict_issue_worklogs[issue_id], report, today)
+				if analysis_cache is not None:
+					analysis_cache[issue_id] = analysis
+
+			dict_issue_fix_version[issue_id] = analysis.issue_record.fix_version
+			issue_records.append(analysis.issue_record)
+			num_worklogs += len(analysis.jiradata_records)
+
+			jiradata_writer.write(analysis.jiradata_records)
+			tasks_data_writer.write([analysis.task_record])
+			if aggregator:
+				aggregator.add(analysis)
+
+		# end for issue in issues
+
+		metrics.count_issues(report.name, len(issues), num_worklogs)
+		validation.add(issue_records)
+
+		# the page is released before the next one is downloaded
+		del issues, dict_issue_worklogs
+		page = next(pages, None)
+	# end for issues in pages
+
+	if validation.rules_after_load:
+		# a parent issue may come in a later page than its sub-tasks, so the rules on
+		# its fix version run once every issue has been read. Parents that are not in
+		# the filter are downloaded (or read from the cache) all at once
+		missing_parent_ids = validation.find_parent_ids(dict_issue_fix_version)
+		if missing_parent_ids:
+			with metrics.phase('issues'):
+				parent_fix_versions = find_parent_fix_versions(auth_code, missing_parent_ids, full_refresh)
+			if parent_fix_versions is None:
+				raise BaseException('Could not download the parent issues')
+			dict_issue_fix_version.update(parent_fix_versions)
+	validation.finish(dict_issue_fix_version)
+	validation.record_metrics(report.name)
+
+	len_tasks_data = tasks_data_writer.num_rows
 	print('Tasks:', len_tasks_data)
 		
-	updateTabData(TAB_JIRADATA, jiradata)
-	updateTabData(TAB_TASKSDATA, tasks_data)
+	jiradata_writer.close()
+	tasks_data_writer.close()
 
-	errors = []
-	add_errors_if_exist(errors, errors_different_version)
-	add_errors_if_exist(errors, errors_open_no_remaining)
-	add_errors_if_exist(errors, errors_open_old_updated)
-	add_errors_if_exist(errors, errors_closed_with_remaining)
-	add_errors_if_exist(errors, errors_closed_with_zero_spent)
-	add_errors_if_exist(errors, errors_issues_deviated)
-	add_errors_if_exist(errors, errors_np_no_estimate)
-	add_errors_if_exist(errors, errors_parent_with_spent)
+	if aggregator:
+		for tab, rows in aggregator.get_tabs_rows().items():
+			created = not sheet_writer.has_tab(tab)
+			if created:
+				sheet_writer.add_tab(tab, AGGREGATE_TABS[tab])
+			# the snapshot of a tab that was removed from the report is not valid
+			updateTabData(sheet_writer, tab, rows, differential and not created)
 
-	updateTabData(TAB_ERRORES, errors)
+	errors = validation.get_error_rows()
+
+	updateTabData(sheet_writer, TAB_ERRORES, errors, differential)
+	sheet_writer.update_data_ranges()
 
 	# Register the date and person updating the report (in the Indice tab of the report)
-	google_sheet.worksheet('Índice').update_acell('E4', datetime.today().strftime('%d/%b/%Y') + ' (' + creds['user_name'] + ')')
+	sheet_writer.update_values(TAB_INDICE + '!' + CELL_LAST_UPDATE,
+		[[datetime.today().strftime('%d/%b/%Y') + ' (' + creds['user_name'] + ')']])
+	sheet_writer.flush()
 
 	print('Finished.')
+	return True
+
+def analyze_issue(issue, worklogs, report, today):
+	''' Analyzes an issue (as returned by Jira) of report (a ReportConfig) with
+	its worklogs (Worklog records). today is the number of the current day
+	(date.toordinal). Returns the IssueAnalysis of the issue.'''
+
+	issue_id = issue['id']
+	issue_key = issue['key']
+	fields = issue['fields']
+	issue_link = URL_BROWSE_ISSUE.substitute(jira_url=conf_jira_url, issue_key=issue_key)
+	issue_summary = fields['summary']
+	issue_fix_version = sys.intern(fields['fixVersions'][0]['name'])
+	
+	issue_assigned_to = 'Sin asignar'
+	issue_field_assigned_to = fields['assignee']
+	if issue_field_assigned_to:
+		issue_assigned_to = sys.intern(issue_field_assigned_to['displayName'])
+	
+	issue_status = sys.intern(fields['status']['name'])
+	issue_created = parse_jira_date(fields['created']).day
+	updated = parse_jira_date(fields['updated'])
+	issue_updated = updated.day
+	resolved = parse_jira_date(fields['resolutiondate'])
+	issue_resolved = resolved.day
+	issue_resolved_month = resolved.month
+	issue_incidence_type = ''
+	issue_field_incidence_type = fields['customfield_15190']
+	if issue_field_incidence_type:
+		issue_incidence_type = issue_field_incidence_type['value']
+
+	is_shared = calculate_shared_issue(worklogs, issue_assigned_to, report.percentage_shared_issue)
+	is_team_exclusive = calculate_team_exclusive(worklogs, report.team)
+	project_name = sys.intern(fields['project']['name'])
+	issue_type = sys.intern(fields['issuetype']['name'])
+	issue_title = issue_summary
+	issue_time_original_estimate = to_hours(fields['timeoriginalestimate'])
+	issue_time_estimate = to_hours(fields['timeestimate'])
+	issue_time_spent = to_hours(fields['timespent'])
+	jiradata_base = (project_name, issue_type, 
+		issue_key, issue_title, issue_time_original_estimate,
+		issue_time_estimate, issue_time_spent)
+
+	issue_parent_summary = ''
+	issue_parent_key = ''
+	issue_parent_id = ''
+	if fields.get('parent'):
+		issue_field_parent = fields['parent']
+		issue_parent_summary = issue_field_parent['fields']['summary']
+		issue_parent_key = issue_field_parent['key']
+		issue_parent_id = issue_field_parent['id']
+
+	if issue_parent_key:
+		# if issue it's not a parent issue
+		is_deviated = int(issue_time_original_estimate) < int(issue_time_spent) + int(issue_time_estimate)
+	else:
+		# if it is a parent issue
+		issue_aggregate_time_original_estimate = fields['aggregatetimeoriginalestimate']
+		issue_aggregate_time_estimate = fields['aggregatetimeestimate']
+		issue_aggregate_time_spent = fields['aggregatetimespent']
+		is_deviated = bool(issue_aggregate_time_original_estimate and issue_aggregate_time_estimate and issue_aggregate_time_spent \
+			and int(issue_aggregate_time_original_estimate) < int(issue_aggregate_time_spent) + int(issue_aggregate_time_estimate))
+
+	issue_record = IssueRecord(issue_id, issue_key, issue_summary, issue_assigned_to, issue_link,
+		issue_status, issue_fix_version, bool(issue_parent_key), issue_parent_id, issue_parent_key,
+		issue_parent_summary, issue_time_original_estimate, issue_time_estimate, issue_time_spent,
+		is_deviated, issue_updated, today - updated.ordinal,
+		issue_summary.strip().startswith(('NP_', 'NP-')), '', False)
+
+	jiradata_records = get_jiradata_records(jiradata_base, worklogs, is_shared, is_team_exclusive)
+
+	task_record = TaskRecord(issue_key, issue_summary, issue_assigned_to,
+		issue_time_original_estimate, issue_time_estimate, issue_time_spent,
+		issue_fix_version, issue_status, issue_created, issue_updated, 
+		issue_resolved, issue_resolved_month, issue_incidence_type,
+		issue_parent_summary, issue_link, is_shared, is_team_exclusive)
+
+	return IssueAnalysis(jiradata_records, task_record, issue_record, project_name, issue_type)
+
+def iter_report_pages(auth_code, report, full_refresh, changed_ids=None, skip_ids=frozenset()):
+	''' Generator that yields, page by page and in the order of the
+	report's filter, the issues to analyze and a dict with the worklogs
+	of each one of them.
+	With the incremental sync, if changed_ids is given only those issues (and
+	their parents) are synchronized (see update_store_issues) and the issues
+	in skip_ids that were not synchronized are not read from the store (see
+	iter_store_pages).'''
+
+	if conf_incremental_sync:
+		refreshed_ids = frozenset()
+		with metrics.phase('issues'), get_jira_store_lock(report.filter_id):
+			if changed_ids is None:
+				issue_ids = sync_jira_store(auth_code, report.filter_id, full_refresh)
+			else:
+				issue_ids, refreshed_ids = update_store_issues(auth_code, report.filter_id, changed_ids)
+		if issue_ids is not None:
+			yield from iter_store_pages(report.filter_id, issue_ids, skip_ids - refreshed_ids)
+		return
 
-def add_errors_if_exist(errors_general, errors_subtype):
-	if len(errors_subtype) > 2:
-		# if there are no errors, the list contains anyway two elements (title and headers)
-		errors_general.extend(errors_subtype)
+	with metrics.phase('issues'):
+		url_find_issues = find_search_url(auth_code, report.filter_id)
+	if not url_find_issues:
+		return
+
+	first = True
+	for issues in iter_issue_pages(auth_code, url_find_issues):
+		if issues is None:
+			if first:
+				return
+			# some rows have already been uploaded
+			raise BaseException('Not all issues where downloaded from Jira')
+		first = False
+		yield issues, find_all_worklogs(auth_code, issues)
+
+class ValidationRule:
+	''' A check of the issues of a report, defined by a dict (see VALIDATION_RULES)
+	with: name, title (first row of its errors in the Errores tab), columns (fields
+	of IssueRecord shown for each issue that matches), headers (of the columns; the
+	fields' names by default) and when: the conditions on the fields of IssueRecord
+	that an issue must meet (all of them) as field: value, field: [values] (any
+	of them) or field: {operator: value, ...} (see RULE_OPERATORS).'''
+
+	def __init__(self, definition):
+		self.name = definition.get('name')
+		if not self.name:
+			raise BaseException('Validation rule without name: ' + json.dumps(definition, ensure_ascii=False))
+		try:
+			self.title = definition['title']
+			self.columns = [self.get_field_index(field) for field in definition['columns']]
+			self.headers = definition.get('headers', definition['columns'])
+			if len(self.headers) != len(self.columns):
+				raise ValueError('headers and columns have different length')
+			self.conditions = [(self.get_field_index(field), self.compile_condition(condition))
+				for field, condition in definition['when'].items()]
+			# rules on fields known once every issue is read
+			self.after_load = any(field in ISSUE_FIELDS_AFTER_LOAD for field in definition['when'])
+		except (KeyError, ValueError, AttributeError, TypeError) as e:
+			raise BaseException('Wrong validation rule ' + str(self.name) + ': ' + str(e))
+
+	@staticmethod
+	def get_field_index(field):
+		if field not in IssueRecord._fields:
+			raise ValueError('unknown field ' + str(field))
+		return IssueRecord._fields.index(field)
+
+	@staticmethod
+	def compile_condition(condition):
+		''' Returns a function that says if a value meets the condition.'''
+
+		if isinstance(condition, list):
+			values = set(condition)
+			return lambda value: value in values
+		if not isinstance(condition, dict):
+			return lambda value: value == condition
+
+		checks = []
+		for operator_name, argument in condition.items():
+			if operator_name not in RULE_OPERATORS:
+				raise ValueError('unknown operator ' + operator_name)
+			if isinstance(argument, list):
+				argument = tuple(argument) if operator_name == 'startsWith' else set(argument)
+			checks.append((RULE_OPERATORS[operator_name], argument))
+		if len(checks) == 1:
+			check, argument = checks[0]
+			return lambda value: check(value, argument)
+		return lambda value: all(check(value, argument) for check, argument in checks)
+
+	def matches(self, record):
+		for index, condition in self.conditions:
+			if not condition(record[index]):
+				return False
+		return True
+
+	def get_row(self, record):
+		return [record[index] for index in self.columns]
+
+
+class ValidationEngine:
+	''' Runs the rules (ValidationRule) over the records (IssueRecord) of the
+	issues of a report in one pass, a page at a time (see add). The rules that
+	use the parent's fix version (ISSUE_FIELDS_AFTER_LOAD) run in finish, once
+	every issue has been read. Keeps the rows of the issues that match each
+	rule and the time spent evaluating it.
+	If columnar is True each condition of a rule is evaluated over the column
+	of its field in the page, only for the issues that met the previous ones,
+	instead of issue by issue (faster with big pages and selective rules).'''
+
+	def __init__(self, rules, columnar=False):
+		self.rules = rules
+		self.rules_in_pass = [rule for rule in rules if not rule.after_load]
+		self.rules_after_load = [rule for rule in rules if rule.after_load]
+		self.columnar = columnar
+		self.rows = {rule.name: [] for rule in rules}
+		self.seconds = {rule.name: 0 for rule in rules}
+		self.pending_records = [] # records for the rules that run in finish
+
+	def add(self, records):
+		self.evaluate(self.rules_in_pass, records)
+		if self.rules_after_load:
+			self.pending_records.extend(records)
+
+	def find_parent_ids(self, dict_issue_fix_version):
+		''' Returns the IDs of the parents whose fix version is not in dict_issue_fix_version.'''
+
+		return sorted(set(record.parent_id for record in self.pending_records
+			if record.parent_id and record.parent_id not in dict_issue_fix_version))
+
+	def finish(self, dict_issue_fix_version):
+		''' Runs the rules that use the parent's fix version (taken from dict_issue_fix_version).'''
+
+		records = self.pending_records
+		self.pending_records = []
+		for i, record in enumerate(records):
+			if record.parent_id:
+				parent_fix_version = dict_issue_fix_version.get(record.parent_id, '')
+				different_version = bool(parent_fix_version and record.fix_version
+					and parent_fix_version != record.fix_version)
+				# ISSUE_FIELDS_AFTER_LOAD are the last fields (faster than _replace)
+				records[i] = IssueRecord._make(record[:-2] + (parent_fix_version, different_version))
+		self.evaluate(self.rules_after_load, records)
+
+	def evaluate(self, rules, records):
+		if not rules or not records:
+			return
+
+		if self.columnar:
+			columns = {} # only the fields used by the rules
+			for rule in rules:
+				start = time.perf_counter()
+				candidates = range(len(records))
+				for index, condition in rule.conditions:
+					column = columns.get(index)
+					if column is None:
+						column = columns[index] = [record[index] for record in records]
+					candidates = [i for i in candidates if condition(column[i])]
+				self.rows[rule.name].extend(rule.get_row(records[i]) for i in candidates)
+				self.seconds[rule.name] += time.perf_counter() - start
+			return
+
+		# rule by rule (the rows of each one keep the records' order) so
+		# each rule is timed once per page, not once per record
+		for rule in rules:
+			start = time.perf_counter()
+			matches = rule.matches
+			self.rows[rule.name].extend(rule.get_row(record) for record in records if matches(record))
+			self.seconds[rule.name] += time.perf_counter() - start
+
+	def get_error_rows(self):
+		''' Returns the rows of the Errores tab: title, headers and
+		issues of every rule with some issue (in the rules' order).'''
+
+		errors = []
+		for rule in self.rules:
+			rows = self.rows[rule.name]
+			if rows:
+				errors.append([rule.title])
+				errors.append(list(rule.headers))
+				errors.extend(rows)
+		return errors
+
+	def record_metrics(self, report_name):
+		for rule in self.rules:
+			metrics.record_rule(report_name, rule.name, self.seconds[rule.name], len(self.rows[rule.name]))
+
+
+def get_validation_rules():
+	''' Returns the ValidationRule of the rules enabled: VALIDATION_RULES (replaced
+	by the rule of conf_custom_rules with the same name, if any) followed by
+	the rest of conf_custom_rules, except the ones in conf_disabled_rules.'''
+
+	definitions = {definition['name']: definition for definition in VALIDATION_RULES}
+	for definition in conf_custom_rules:
+		definitions[definition.get('name')] = definition
+	for name in conf_disabled_rules:
+		if name not in definitions:
+			raise BaseException('Unknown validation rule to disable: ' + str(name))
+	return [ValidationRule(definition) for name, definition in definitions.items()
+		if name not in conf_disabled_rules]
 
 def to_hours(seconds):
 	''' Accepts a number of seconds and returns the
@@ -294,38 +1100,406 @@ def to_hours(seconds):
 	else:
 		return 0
 
-def updateTabData(tab, data):
+def updateTabData(sheet_writer, tab, data, differential=False):
 	''' Clears the tab's content except the header row and then adds the data.
-	tab is the name of a tab and data is a list of rows to be inserted into that tab'''
-	clearTabContent(google_sheet, tab)
-	fill_with_blanks(data, NUM_ROWS_TO_INSERT)
-
-	data = data or ['']
-
-	google_sheet.values_update(
-		tab + '!A2', # skip headers row
-		params={'valueInputOption': 'USER_ENTERED'},
-		# USER_ENTERED so it respects the type of data (RAW would convert to string appending an apostrophe like '234)
-		body={'values': data}
-	)
-
-	print(tab, 'updated.')
-
-
-def fill_with_blanks(a_list, num_rows):
-	''' Fills the list withs arrays of empty strings up to num_rows elements (at the
-	end a_list's size will be num_rows. Each appended array will contain num_cols 
-	empty strings.'''
-
-	empty_list = ['']
-	s = len(a_list)
-	for i in range(s, num_rows):
-		a_list.append(empty_list)
-
-
-def clearTabContent(google_sheet, tab):
-	google_worksheet = google_sheet.worksheet(tab)
-	google_worksheet.resize(rows=2) 
+	tab is the name of a tab and data is a list of rows to be inserted into that tab.
+	If differential is True only the rows that changed are sent (see TabWriter).'''
+	writer = TabWriter(sheet_writer, tab, differential)
+	writer.write(data)
+	writer.close()
+
+
+class TabWriter:
+	''' Uploads rows to a tab as they are written, in chunks of
+	conf_upload_chunk_rows, so the tab's data is never fully kept in memory.
+
+	If differential is True and there is a snapshot of the last load of
+	the tab (and the tab still has its rows), only the rows that differ from
+	it are sent (grouped in ranges of consecutive rows, all of a chunk in
+	one request). Otherwise the tab's content (except the header row) is
+	cleared when the writer is created.
+	The snapshot is removed before the tab is changed and saved again once
+	every row was sent (see SheetWriter.flush), so a load that fails midway
+	is followed by a complete one.
+	The rows are sent through sheet_writer (a SheetWriter).'''
+
+	def __init__(self, sheet_writer, tab, differential=False):
+		self.sheet_writer = sheet_writer
+		self.tab = tab
+		self.buffer = [] # (row number, row) of the rows pending to be uploaded
+		self.rows_sent = 0 # rows that changed (all of them if not differential)
+		self.seconds = 0 # time spent hashing and queueing the rows
+		self.num_rows = 0 # rows written so far
+		self.width = 0 # maximum number of columns of a row
+		self.row_hashes = [] if conf_differential_upload else None
+		self.previous_hashes = []
+
+		snapshot = load_sheet_snapshot(sheet_writer.report_name).get(tab) if self.row_hashes is not None else None
+		if snapshot is not None:
+			delete_sheet_snapshot(sheet_writer.report_name, tab)
+			row_count = sheet_writer.get_row_count(tab)
+			if row_count is not None and row_count != len(snapshot['rows']) + 1:
+				print(tab, 'has', row_count - 1, 'rows but', len(snapshot['rows']), 'were uploaded. Uploading every row...')
+				snapshot = None
+
+		if differential and snapshot:
+			self.previous_hashes = snapshot['rows']
+			self.width = snapshot['width']
+		else:
+			clearTabContent(sheet_writer, tab)
+
+	def write(self, rows):
+		start = time.perf_counter()
+		for row in rows:
+			index = self.num_rows
+			self.num_rows += 1
+			self.width = max(self.width, len(row))
+
+			if self.row_hashes is not None:
+				row_hash = hashlib.md5(json.dumps(row, ensure_ascii=False).encode('utf-8')).hexdigest()
+				self.row_hashes.append(row_hash)
+				if index < len(self.previous_hashes) and self.previous_hashes[index] == row_hash:
+					continue
+
+			self.buffer.append((index + 2, row)) # skip headers row
+
+		if len(self.buffer) >= conf_upload_chunk_rows:
+			self.flush()
+		self.seconds += time.perf_counter() - start
+
+	def flush(self):
+		if len(self.buffer) == 0:
+			return
+
+		self.rows_sent += len(self.buffer)
+		first_row = None
+		rows = []
+		for row_number, row in self.buffer:
+			row = list(row)
+			if row_number - 2 < len(self.previous_hashes):
+				# blanks so the longer row written in the previous load is fully overwritten
+				row += [''] * (self.width - len(row))
+			if rows and first_row + len(rows) != row_number:
+				self.sheet_writer.update_rows(self.tab, first_row, rows)
+				rows = []
+			if not rows:
+				first_row = row_number
+			rows.append(row)
+
+		self.sheet_writer.update_rows(self.tab, first_row, rows)
+		self.buffer = []
+
+	def close(self):
+		''' Uploads the pending rows and leaves the tab with exactly the rows written.'''
+		if self.num_rows == 0:
+			# the first data row is never removed (see clearTabContent)
+			self.write([['']])
+		start = time.perf_counter()
+		self.flush()
+
+		if self.row_hashes is None or len(self.previous_hashes) != self.num_rows:
+			# removes the rows of the previous load that were not overwritten
+			self.sheet_writer.resize(self.tab, self.num_rows + 1)
+
+		if self.row_hashes is not None:
+			self.sheet_writer.save_snapshot(self.tab, {'rows': self.row_hashes, 'width': self.width})
+
+		self.seconds += time.perf_counter() - start
+		metrics.record_tab(self.sheet_writer.report_name, self.tab, self.seconds, self.num_rows, self.rows_sent)
+		print(self.tab, 'updated.')
+
+
+class ShardedTabWriter:
+	''' Writes rows like TabWriter but spreading them across tab, tab_2,
+	tab_3... with up to conf_max_rows_per_tab rows each. The tabs that don't
+	exist are created as copies of tab and the ones that are not needed
+	anymore (from previous loads) are emptied.'''
+
+	def __init__(self, sheet_writer, tab, differential=False):
+		self.sheet_writer = sheet_writer
+		self.tab = tab
+		self.differential = differential
+		self.num_tabs = 1
+		self.num_rows = 0
+		self.writer = TabWriter(sheet_writer, tab, differential)
+
+	def write(self, rows):
+		start = 0
+		while start < len(rows):
+			if self.writer.num_rows >= conf_max_rows_per_tab:
+				self.writer.close()
+				self.num_tabs += 1
+				shard = TAB_SHARD_NAME.substitute(tab=self.tab, number=self.num_tabs)
+				created = not self.sheet_writer.has_tab(shard)
+				if created:
+					self.sheet_writer.copy_tab(self.tab, shard)
+				# the snapshot of a shard that was removed is not valid (the copy has the rows of tab)
+				self.writer = TabWriter(self.sheet_writer, shard, self.differential and not created)
+
+			end = start + conf_max_rows_per_tab - self.writer.num_rows
+			self.writer.write(rows[start:end])
+			start = end
+
+		self.num_rows += len(rows)
+
+	def close(self):
+		self.writer.close()
+
+		number = self.num_tabs + 1
+		shard = TAB_SHARD_NAME.substitute(tab=self.tab, number=number)
+		while self.sheet_writer.has_tab(shard):
+			updateTabData(self.sheet_writer, shard, [], self.differential)
+			number += 1
+			shard = TAB_SHARD_NAME.substitute(tab=self.tab, number=number)
+
+
+class SheetWriter:
+	''' Sends the changes to the report with as few requests as possible.
+	Changes to the tabs (sizes, named ranges...) and value updates are
+	queued and sent in batches (one batch_update for consecutive changes
+	and one values_batch_update for consecutive value updates), each of
+	them not bigger than
+	SHEETS_MAX_PAYLOAD_BYTES. The requests are spaced so that no more than
+	conf_sheets_requests_per_minute are sent in a minute, and the ones
+	rejected because of quotas or server errors are retried with
+	exponential backoff.'''
+
+	def __init__(self, spreadsheet, report_name):
+		self.spreadsheet = spreadsheet
+		self.report_name = report_name # to keep apart its snapshot and measures
+		self.sheet_ids = {}
+		self.sheet_titles = {}
+		self.named_ranges = []
+		self.tab_rows = {} # rows (header included) of the resized tabs
+		self.row_counts = {} # rows (header included) of each tab when the load started
+		self.pending_snapshots = {} # snapshots of the tabs saved when their rows are sent (see TabWriter)
+		self.pending = [] # ('request', request) or ('values', value range) in the order they must be applied
+		self.pending_bytes = 0
+
+	def read_metadata(self, cell):
+		''' Reads the IDs of the tabs, the named ranges and the value of cell
+		(like 'Tab!A1') with only one request. Returns the value of cell.'''
+
+		metadata = self.send(self.spreadsheet.fetch_sheet_metadata, params={
+			'ranges': cell,
+			'includeGridData': 'true',
+			'fields': 'namedRanges,sheets(properties(sheetId,title,gridProperties(rowCount)),data(rowData(values(formattedValue))))'})
+
+		self.named_ranges = metadata.get('namedRanges', [])
+		value = None
+		for sheet in metadata['sheets']:
+			self.sheet_ids[sheet['properties']['title']] = sheet['properties']['sheetId']
+			self.sheet_titles[sheet['properties']['sheetId']] = sheet['properties']['title']
+			row_count = sheet['properties'].get('gridProperties', {}).get('rowCount')
+			if row_count is not None:
+				self.row_counts[sheet['properties']['title']] = row_count
+			for grid_data in sheet.get('data', []):
+				for row_data in grid_data.get('rowData', []):
+					for cell_data in row_data.get('values', []):
+						value = cell_data.get('formattedValue')
+		return value
+
+	def has_tab(self, tab):
+		return tab in self.sheet_ids
+
+	def get_row_count(self, tab):
+		''' Returns the rows (header included) of tab when the load started
+		or None if they are not known.'''
+		return self.row_counts.get(tab)
+
+	def save_snapshot(self, tab, tab_snapshot):
+		''' Saves the snapshot of tab once every queued change is sent.'''
+		self.pending_snapshots[tab] = tab_snapshot
+
+	def copy_tab(self, tab, new_tab):
+		''' Creates new_tab as a copy of tab (right after it).'''
+
+		self.flush()
+		reply = self.send(self.spreadsheet.batch_update, {'requests': [{'duplicateSheet': {
+			'sourceSheetId': self.sheet_ids[tab],
+			'newSheetName': new_tab}}]})
+		sheet_id = reply['replies'][0]['duplicateSheet']['properties']['sheetId']
+		self.sheet_ids[new_tab] = sheet_id
+		self.sheet_titles[sheet_id] = new_tab
+
+	def add_tab(self, tab, headers):
+		''' Creates tab (after the rest) with headers in its first row.'''
+
+		self.flush()
+		reply = self.send(self.spreadsheet.batch_update, {'requests': [{'addSheet': {
+			'properties': {'title': tab}}}]})
+		sheet_id = reply['replies'][0]['addSheet']['properties']['sheetId']
+		self.sheet_ids[tab] = sheet_id
+		self.sheet_titles[sheet_id] = tab
+		self.update_values(tab + '!A1', [headers])
+
+	def resize(self, tab, rows):
+		self.tab_rows[tab] = rows
+		self.queue('request', {'updateSheetProperties': {
+			'properties': {'sheetId': self.sheet_ids[tab], 'gridProperties': {'rowCount': rows}},
+			'fields': 'gridProperties.rowCount'}}, 100)
+
+	def update_data_ranges(self):
+		''' Makes the named ranges and the pivot tables (of the tabs in
+		conf_pivot_tabs) that read from a resized tab cover all its rows.
+		Only the named ranges that ended at the last row of the tab are
+		changed (the ones of the header or of fixed size are left alone).
+		Pivot tables read only one tab, so they only cover the first tab
+		of a sharded table.'''
+
+		for named_range in self.named_ranges:
+			grid_range = named_range['range']
+			tab = self.sheet_titles.get(grid_range.get('sheetId', 0))
+			if (tab in self.tab_rows and 'endRowIndex' in grid_range and
+					grid_range['endRowIndex'] == self.row_counts.get(tab) and
+					grid_range['endRowIndex'] != self.tab_rows[tab]):
+				grid_range['endRowIndex'] = self.tab_rows[tab]
+				self.queue('request', {'updateNamedRange': {'namedRange': named_range, 'fields': 'range'}}, 200)
+
+		if not conf_pivot_tabs or not self.tab_rows:
+			return
+
+		metadata = self.send(self.spreadsheet.fetch_sheet_metadata, params={
+			'ranges': conf_pivot_tabs,
+			'includeGridData': 'true',
+			'fields': 'sheets(properties(sheetId),data(startRow,startColumn,rowData(values(pivotTable))))'})
+
+		for sheet in metadata['sheets']:
+			for grid_data in sheet.get('data', []):
+				for row_index, row_data in enumerate(grid_data.get('rowData', [])):
+					for column_index, cell_data in enumerate(row_data.get('values', [])):
+						pivot_table = cell_data.get('pivotTable')
+						if not pivot_table:
+							continue
+						source = pivot_table['source']
+						tab = self.sheet_titles.get(source.get('sheetId', 0))
+						if tab not in self.tab_rows:
+							continue
+						source['endRowIndex'] = self.tab_rows[tab]
+						self.queue('request', {'updateCells': {
+							'rows': [{'values': [{'pivotTable': pivot_table}]}],
+							'start': {
+								'sheetId': sheet['properties']['sheetId'],
+								'rowIndex': grid_data.get('startRow', 0) + row_index,
+								'columnIndex': grid_data.get('startColumn', 0) + column_index},
+							'fields': 'pivotTable'}}, len(json.dumps(pivot_table)))
+
+	def update_values(self, range_name, values):
+		self.queue('values', {'range': range_name, 'values': values}, len(json.dumps(values)))
+
+	def update_rows(self, tab, first_row, rows):
+		''' Queues the update of rows starting at row number first_row (column A)
+		split in several ranges if they don't fit in one request.'''
+
+		part_first_row = first_row
+		part = []
+		part_bytes = 0
+		for row in rows:
+			row_bytes = len(json.dumps(row))
+			if part and part_bytes + row_bytes > SHEETS_MAX_PAYLOAD_BYTES // 2:
+				self.queue('values', {'range': tab + '!A' + str(part_first_row), 'values': part}, part_bytes)
+				part_first_row += len(part)
+				part = []
+				part_bytes = 0
+			part.append(row)
+			part_bytes += row_bytes
+
+		if part:
+			self.queue('values', {'range': tab + '!A' + str(part_first_row), 'values': part}, part_bytes)
+
+	def queue(self, kind, item, size):
+		if self.pending_bytes + size > SHEETS_MAX_PAYLOAD_BYTES:
+			self.flush()
+		self.pending.append((kind, item))
+		self.pending_bytes += size
+
+	def flush(self):
+		''' Sends every queued change.'''
+
+		for kind, group in itertools.groupby(self.pending, key=lambda pending: pending[0]):
+			items = [item for _, item in group]
+			if kind == 'request':
+				self.send(self.spreadsheet.batch_update, {'requests': items})
+			else:
+				self.send(self.spreadsheet.values_batch_update, body={
+					# USER_ENTERED so it respects the type of data (RAW would convert to string appending an apostrophe like '234)
+					'valueInputOption': 'USER_ENTERED',
+					'data': items})
+
+		self.pending = []
+		self.pending_bytes = 0
+
+		if self.pending_snapshots:
+			save_sheet_snapshot(self.report_name, self.pending_snapshots)
+			self.pending_snapshots = {}
+
+	def send(self, method, *args, **kwargs):
+		''' Calls method (a request to Sheets API) respecting the quota and retrying it if needed.'''
+
+		from gspread.exceptions import APIError
+
+		for attempt in range(conf_max_retries + 1):
+			self.wait_for_quota()
+			start = time.perf_counter()
+			try:
+				with metrics.phase('upload'):
+					reply = method(*args, **kwargs)
+				metrics.record_request('sheets', method.__name__, time.perf_counter() - start, attempt, True)
+				return reply
+			except APIError as e:
+				if e.response.status_code not in SHEETS_RETRY_STATUS or attempt == conf_max_retries:
+					metrics.record_request('sheets', method.__name__, time.perf_counter() - start, attempt, False)
+					raise
+				wait = 2 ** attempt
+				print('Google Sheets answered', e.response.status_code, '- retrying in', wait, 'seconds.')
+				time.sleep(wait)
+
+	def wait_for_quota(self):
+		''' Blocks until a request can be sent without exceeding
+		conf_sheets_requests_per_minute (counting every report's requests).'''
+		if conf_sheets_requests_per_minute <= 0:
+			return
+		while True:
+			with sheets_quota_lock:
+				now = time.monotonic()
+				while sheets_request_times and now - sheets_request_times[0] >= 60:
+					sheets_request_times.popleft()
+				if len(sheets_request_times) < conf_sheets_requests_per_minute:
+					sheets_request_times.append(now)
+					return
+				wait = 60 - (now - sheets_request_times[0])
+			time.sleep(wait)
+
+
+def load_sheet_snapshot(report_name):
+	''' Returns the snapshot of the last load of every tab of a report (a dict
+	with the hashes of the rows and the number of columns of each tab).'''
+
+	snapshot_file = BASE_DIR + SHEET_SNAPSHOT_FILE.substitute(report=report_name)
+	if not os.path.exists(snapshot_file):
+		return {}
+	with open(snapshot_file) as f:
+		return json.load(f)
+
+
+def save_sheet_snapshot(report_name, tabs_snapshots):
+	''' Saves the snapshot of the tabs in tabs_snapshots (a dict by tab).'''
+
+	snapshot = load_sheet_snapshot(report_name)
+	snapshot.update(tabs_snapshots)
+	with open(BASE_DIR + SHEET_SNAPSHOT_FILE.substitute(report=report_name), 'w') as f:
+		json.dump(snapshot, f)
+
+
+def delete_sheet_snapshot(report_name, tab):
+	snapshot = load_sheet_snapshot(report_name)
+	if snapshot.pop(tab, None) is not None:
+		with open(BASE_DIR + SHEET_SNAPSHOT_FILE.substitute(report=report_name), 'w') as f:
+			json.dump(snapshot, f)
+
+
+def clearTabContent(sheet_writer, tab):
+	sheet_writer.resize(tab, 2)
 	# leaves the header and the first data row 
 	# (so header's style is not propagated to new 
 	# rows when they are added)
@@ -335,52 +1509,87 @@ def get_jiradata_records(jiradata_base, worklogs, is_shared, is_team_exclusive):
 	''' Builds records for JIRADATA tab using the info from
 	jiradata_base and adding a new record for each worklog
 	with proper worklog's info.
-	jiradata_base is a list containing info from the issue.
-	worklogs is a list of JSON objects with fields:
-	started, author, timeSpent and comment (as returned 
+	jiradata_base is a tuple containing info from the issue.
+	worklogs is a list of Worklog records (as returned
 	by find_worklogs method).'''
 
-	jiradata_records = []
-	for worklog in worklogs:
-		jiradata_record = []
-		jiradata_record.extend(jiradata_base)
-		jiradata_record.append(worklog['started'])
-		jiradata_record.append(worklog['author'])
-		jiradata_record.append(worklog['timeSpent'])
-		jiradata_record.append(worklog['comment'])
-		jiradata_record.append(is_shared)
-		jiradata_record.append(is_team_exclusive)
-
-		jiradata_records.append(jiradata_record)
-
-	return jiradata_records
-
-
-def calculate_shared_issue(worklog, issue_assigned_to):
-	''' Takes a list of JSON objects with attributes (author, timeSpent and comment)
-	for worklogs of an issue and the person to whom the issue is assigned.
+	return [JiraDataRecord(*jiradata_base, worklog.started, worklog.author,
+			worklog.timeSpent, worklog.comment, is_shared, is_team_exclusive)
+		for worklog in worklogs]
+
+
+class HoursAggregator:
+	''' Adds up in one pass, as the issues are analyzed, the hours and worklogs
+	of each person and month, and the issues, hours and worklogs of each fix
+	version, project and issue type, and shared/team-exclusive value (see
+	calculate_shared_issue and calculate_team_exclusive). Those are the rows
+	of the AGGREGATE_TABS.'''
+
+	def __init__(self):
+		self.person_month = {} # (author, month) -> [hours, worklogs]
+		self.tables = {TAB_HOURS_FIX_VERSION: {}, TAB_HOURS_PROJECT_TYPE: {}, TAB_HOURS_SHARED: {}} # tab -> key -> [issues, hours, worklogs]
+		self.months = {} # worklog's started day ('01/04/2019') -> month ('2019/04')
+
+	def add(self, analysis):
+		''' Adds the hours of an issue (its IssueAnalysis).'''
+
+		issue_hours = 0
+		for record in analysis.jiradata_records:
+			issue_hours += record.worklog_time_spent
+			month = self.months.get(record.started)
+			if month is None:
+				month = self.months[record.started] = record.started[6:10] + '/' + record.started[3:5]
+			totals = self.person_month.get((record.author, month))
+			if totals is None:
+				totals = self.person_month[(record.author, month)] = [0, 0]
+			totals[0] += record.worklog_time_spent
+			totals[1] += 1
+
+		task_record = analysis.task_record
+		for tab, key in ((TAB_HOURS_FIX_VERSION, (task_record.fix_version,)),
+			(TAB_HOURS_PROJECT_TYPE, (analysis.project_name, analysis.issue_type)),
+			(TAB_HOURS_SHARED, (task_record.is_shared, task_record.is_team_exclusive))):
+			totals = self.tables[tab].get(key)
+			if totals is None:
+				totals = self.tables[tab][key] = [0, 0, 0]
+			totals[0] += 1
+			totals[1] += issue_hours
+			totals[2] += len(analysis.jiradata_records)
+
+	def get_tabs_rows(self):
+		''' Returns the rows of each one of the AGGREGATE_TABS (sorted by their keys).'''
+
+		tabs_rows = {TAB_HOURS_PERSON_MONTH: [[author, month, round(hours, 2), num_worklogs]
+			for (author, month), (hours, num_worklogs) in sorted(self.person_month.items())]}
+		for tab, table in self.tables.items():
+			tabs_rows[tab] = [list(key) + [num_issues, round(hours, 2), num_worklogs]
+				for key, (num_issues, hours, num_worklogs) in sorted(table.items())]
+		return tabs_rows
+
+
+def calculate_shared_issue(worklog, issue_assigned_to, percentage_shared_issue):
+	''' Takes a list of Worklog records of an issue and the person
+	to whom the issue is assigned.
 	Returns if the issue (for which the worklog is related to) contains spent times
-	from several people.'''
+	from several people (see ReportConfig.percentage_shared_issue).'''
 	
 	# don't count as shared if the most timespent if from the assigned person
 	acum_total = 0
 	acum_author = 0
-	for json in worklog:
-		author = json['author']
-		timeSpent = json['timeSpent']
-		acum_total += timeSpent
-		if author == issue_assigned_to:
-			acum_author += timeSpent
-	is_shared = (acum_total > 0) and (acum_author / acum_total < conf_percentage_shared_issue)
+	for record in worklog:
+		acum_total += record.timeSpent
+		if record.author == issue_assigned_to:
+			acum_author += record.timeSpent
+	is_shared = (acum_total > 0) and (acum_author / acum_total < percentage_shared_issue)
 	
 	return 'Sí' if is_shared else 'No'
 
-def calculate_team_exclusive(worklog):
+def calculate_team_exclusive(worklog, team):
 	'''Returns true if all the people that worked in the issue were in the 
-	team pointed in the config file.'''
+	team (the list of Jira users of the report's team).'''
 
-	for json in worklog:
-		if json['author_username'] not in conf_team:
+	for record in worklog:
+		if record.author_username not in team:
 			return 'No'
 	
 	return 'Sí'
@@ -388,52 +1597,120 @@ def calculate_team_exclusive(worklog):
 def print_connection_error(response):
 	print('')
 	print('********************************************************************')
-	print('Response error: ', response.status_code)
-	print('Maybe the Jira filter (id filter= ' + str(conf_filter_id) + ')is broken or misconfigured,')
+	print('Response error: ', response.status_code, '(' + response.url + ')')
+	print('Maybe the Jira filter is broken or misconfigured,')
 	print('the credentials are wrong or the user has no access to the filter.')
 	print('********************************************************************')
 	print('')
 
-def find_issues(auth_code):
-	headers = get_basic_auth_header(auth_code)
+def find_search_url(auth_code, filter_id):
+	''' Returns the URL of the search that lists the filter's issues
+	or None if it couldn't be obtained.'''
 
 	url_find_issues = None
-	response = requests.get(URL_FILTER_ISSUES.substitute(filter_id=conf_filter_id), headers=headers)
+	response = jira_get(auth_code, URL_FILTER_ISSUES.substitute(jira_url=conf_jira_url, filter_id=filter_id))
 	if not response.ok:
 		print_connection_error(response)		
-		return []
+		return None
 		
 	response_json = response.json()
 	if len(response_json) > 0:
 		url_find_issues = response_json['searchUrl']
 	
 	if not url_find_issues:
-		print('Could not obtain Jira filter\'s URL from: ', URL_FILTER_ISSUES.substitute(filter_id=conf_filter_id))
-		return []
+		print('Could not obtain Jira filter\'s URL from: ', URL_FILTER_ISSUES.substitute(jira_url=conf_jira_url, filter_id=filter_id))
+		return None
+
+	return url_find_issues
+
+def find_issues(auth_code, url_find_issues, fields=None):
+	''' Downloads the issues returned by url_find_issues (a search, see
+	find_search_url) with only the given fields (ISSUE_FIELDS and
+	conf_extra_fields by default). Returns None if Jira answered with an error.'''
 
 	issues = []
+	for page in iter_issue_pages(auth_code, url_find_issues, fields):
+		if page is None:
+			return None
+		issues.extend(page)
 
-	max_res = 100 # max results per page
-	init_pos = 0
-	total_num_issues = 1 # to allow at least one request
+	return issues
 
-	while init_pos < total_num_issues:
-		pagination = build_pagination_str(init_pos, max_res)
-		response = requests.get(url_find_issues + pagination, headers=headers)
-		if not response.ok:
-			print_connection_error(response)
-			return []
-		response_json = response.json()
-		if len(response_json) > 0:
-			total_num_issues = int(response_json['total'])
-			issues.extend(response_json['issues'])
-		else:
-			total_num_issues = 0
-		
-		init_pos += max_res
-		print('Downloading issues in progress:', init_pos, 'of', total_num_issues, 'issues.')
-	
-	num_issues_downloaded = len(issues)
+def find_issues_by_id(auth_code, url_find_issues, issue_ids, fields=None):
+	''' Downloads the issues of url_find_issues whose IDs are in issue_ids
+	(see iter_issues_by_id). Returns None if Jira answered with an error.'''
+
+	issues = []
+	for chunk, chunk_issues in iter_issues_by_id(auth_code, url_find_issues, issue_ids, fields):
+		if chunk_issues is None:
+			return None
+		issues.extend(chunk_issues)
+	return issues
+
+def iter_issues_by_id(auth_code, url_find_issues, issue_ids, fields=None):
+	''' Generator that yields each chunk of ISSUES_BY_ID_CHUNK IDs of
+	issue_ids and the issues of url_find_issues among them (see find_issues),
+	or None instead of the issues if Jira answered with an error.'''
+
+	for i in range(0, len(issue_ids), ISSUES_BY_ID_CHUNK):
+		chunk = issue_ids[i:i + ISSUES_BY_ID_CHUNK]
+		yield chunk, find_issues(auth_code, add_jql_clause(url_find_issues, 'id in (' + ','.join(chunk) + ')'), fields)
+
+def iter_issue_pages(auth_code, url_find_issues, fields=None):
+	''' Generator that yields the issues returned by url_find_issues (see
+	find_issues) page by page, in the filter's order. The next pages are
+	downloaded in the background while the current one is being used (up to
+	conf_pages_concurrency at the same time if conf_parallel_pages is True,
+	one otherwise). Yields None if Jira answered with an error.'''
+
+	if fields is None:
+		fields = ISSUE_FIELDS + [field for field in conf_extra_fields if field not in ISSUE_FIELDS]
+	url_find_issues = set_search_param(url_find_issues, 'fields', ','.join(fields))
+
+	max_res = min(conf_page_size, JIRA_MAX_PAGE_SIZE) # max results per page
+
+	# the first page tells how many issues there are
+	with metrics.phase('issues'):
+		first_page = find_issues_page(auth_code, url_find_issues, 0, max_res)
+	if first_page is None:
+		yield None
+		return
+
+	total_num_issues = 0
+	num_issues_downloaded = 0
+	if len(first_page) > 0:
+		total_num_issues = int(first_page['total'])
+		num_issues_downloaded = len(first_page['issues'])
+		print('Downloading issues in progress:', num_issues_downloaded, 'of', total_num_issues, 'issues.')
+		yield first_page['issues']
+
+		# Jira may return less results per page than requested
+		page_size = int(first_page.get('maxResults', max_res)) or max_res
+		offsets = iter(range(page_size, total_num_issues, page_size))
+		pages_ahead = max(1, conf_pages_concurrency) if conf_parallel_pages else 1
+
+		with ThreadPoolExecutor(max_workers=pages_ahead) as executor:
+			def download_next_page():
+				init_pos = next(offsets, None)
+				if init_pos is not None:
+					pending_pages.append(executor.submit(
+						find_issues_page, auth_code, url_find_issues, init_pos, page_size))
+
+			pending_pages = deque()
+			for i in range(pages_ahead):
+				download_next_page()
+
+			while pending_pages:
+				with metrics.phase('issues'):
+					page = pending_pages.popleft().result()
+				if page is None:
+					yield None
+					return
+				download_next_page()
+
+				num_issues_downloaded += len(page['issues'])
+				print('Downloading issues in progress:', num_issues_downloaded, 'of', total_num_issues, 'issues.')
+				yield page['issues']
 	
 	if num_issues_downloaded != total_num_issues:
 		print('Number of issues in Jira: ', total_num_issues)
@@ -441,53 +1718,932 @@ def find_issues(auth_code):
 		raise BaseException('Not all issues where downloaded from Jira')
 
 	print('Number of downloaded issues from Jira: ', num_issues_downloaded)
-	return issues
+
+def find_issues_page(auth_code, url_find_issues, init_pos, max_res):
+	''' Downloads one page of the filter's search. Returns the JSON
+	response or None if Jira answered with an error.'''
+
+	pagination = build_pagination_str(init_pos, max_res)
+	response = jira_get(auth_code, url_find_issues + pagination, stream=ijson is not None)
+	if not response.ok:
+		print_connection_error(response)
+		return None
+	return parse_issues_page(response)
+
+def parse_issues_page(response):
+	''' Reads a page of a search. If ijson is available the issues are
+	parsed while they are downloaded, so the whole body is never held
+	in memory. Returns a JSON object with total, maxResults and issues.'''
+
+	if ijson is None:
+		return response.json()
+
+	response.raw.decode_content = True # gzip
+	page = {'issues': []}
+	builder = None
+	for prefix, event, value in ijson.parse(response.raw, use_float=True):
+		if prefix == 'issues.item' and event == 'start_map':
+			builder = ijson.ObjectBuilder()
+		if builder is not None:
+			builder.event(event, value)
+			if prefix == 'issues.item' and event == 'end_map':
+				page['issues'].append(builder.value)
+				builder = None
+		elif prefix in ('total', 'maxResults', 'startAt'):
+			page[prefix] = int(value)
+
+	metrics.record_response_bytes(response)
+	return page
 
 def get_basic_auth_header(auth_code):
 	return {
 		'Content-type': 'application/json',
 		'Authorization': 'Basic ' + auth_code}
 
+
+class TokenBucket:
+	''' Rate limiter: allows rate requests per second on average and
+	bursts of up to capacity requests. Can be shared between threads.'''
+
+	def __init__(self, rate, capacity):
+		self.rate = rate
+		self.capacity = capacity
+		self.tokens = capacity
+		self.last_refill = time.monotonic()
+		self.lock = threading.Lock()
+
+	def acquire(self):
+		''' Blocks until a token is available and takes it.'''
+		while True:
+			with self.lock:
+				now = time.monotonic()
+				self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.rate)
+				self.last_refill = now
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return
+				wait = (1 - self.tokens) / self.rate
+			time.sleep(wait)
+
+
+def get_jira_session(auth_code):
+	''' Returns the HTTP session used for every request to Jira with
+	auth_code, creating it the first time. The session keeps the
+	connections alive in a pool, asks for gzipped responses and retries
+	failed requests with exponential backoff honouring Retry-After.'''
+
+	global jira_rate_limiter
+	with jira_sessions_lock:
+		session = jira_sessions.get(auth_code)
+		if session is None:
+			import requests
+			from requests.adapters import HTTPAdapter
+			from urllib3.util.retry import Retry
+
+			retry = Retry(
+				total=conf_max_retries,
+				backoff_factor=1,
+				status_forcelist=JIRA_RETRY_STATUS,
+				allowed_methods=None, # also retry POST (used only for queries)
+				respect_retry_after_header=True,
+				raise_on_status=False)
+			# the reports of a batch share the session
+			pool_size = max(conf_worklogs_concurrency, conf_pages_concurrency, 1) * max(1, conf_reports_concurrency)
+			adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+			session = requests.Session()
+			session.mount('https://', adapter)
+			session.mount('http://', adapter)
+			session.headers.update(get_basic_auth_header(auth_code))
+			session.headers['Accept-Encoding'] = 'gzip, deflate'
+			jira_sessions[auth_code] = session
+
+		if jira_rate_limiter is None and conf_requests_per_second > 0:
+			# bursts of at least one request, or a rate below 1 would never allow one
+			jira_rate_limiter = TokenBucket(conf_requests_per_second, max(1, conf_requests_per_second))
+
+	return session
+
+
+def jira_get(auth_code, url, stream=False):
+	''' Sends a GET request to Jira through the shared session. If stream
+	is True the body is not downloaded until it is read.'''
+
+	session = get_jira_session(auth_code)
+	if jira_rate_limiter:
+		jira_rate_limiter.acquire()
+	start = time.perf_counter()
+	response = session.get(url, timeout=JIRA_TIMEOUT, stream=stream)
+	metrics.record_jira_response(response, time.perf_counter() - start)
+	if not stream:
+		metrics.record_response_bytes(response)
+	return response
+
+
+def jira_post(auth_code, url, body):
+	''' Sends a POST request with a JSON body to Jira through the shared session.'''
+
+	session = get_jira_session(auth_code)
+	if jira_rate_limiter:
+		jira_rate_limiter.acquire()
+	start = time.perf_counter()
+	response = session.post(url, json=body, timeout=JIRA_TIMEOUT)
+	metrics.record_jira_response(response, time.perf_counter() - start)
+	metrics.record_response_bytes(response)
+	return response
+
+def find_all_worklogs(auth_code, issues):
+	''' Downloads the worklogs of every issue in issues.
+	Returns a dict with the issue's id as key and the list returned
+	by find_worklogs as value.
+	Without the incremental sync there is no time since which to ask for the
+	changed worklogs, so they are downloaded by issue whatever the backend.'''
+
+	return find_worklogs_by_issue(auth_code, issues)
+
+def find_worklogs_by_issue(auth_code, issues):
+	''' Downloads the worklogs of every issue in issues (one request per
+	issue) using up to conf_worklogs_concurrency simultaneous requests.'''
+
+	def find_issue_worklogs(issue_id):
+		if jira_cache is None:
+			return find_worklogs(auth_code, issue_id)
+		return jira_cache.get(('worklogs', issue_id), lambda: find_worklogs(auth_code, issue_id))
+
+	print('Downloading worklogs of', len(issues), 'issues...')
+	issue_ids = [issue['id'] for issue in issues]
+	with metrics.phase('worklogs'), ThreadPoolExecutor(max_workers=max(1, conf_worklogs_concurrency)) as executor:
+		# map keeps the results in the same order as issue_ids
+		all_worklogs = executor.map(find_issue_worklogs, issue_ids)
+		return dict(zip(issue_ids, all_worklogs))
+
 def find_worklogs(auth_code, param_issue_id):
-	''' Returns a list of JSON objects with attributes (author, timeSpent and comment)
-	for each registered worklog in the issue denoted by param_issue_id'''
+	''' Returns a list of Worklog records for each registered
+	worklog in the issue denoted by param_issue_id'''
 
-	headers = get_basic_auth_header(auth_code)
-	response = requests.get(
-		URL_WORKLOG_TEMPLATE.substitute(issue_id=param_issue_id),
-		headers=headers)
+	response = jira_get(auth_code, URL_WORKLOG_TEMPLATE.substitute(jira_url=conf_jira_url, issue_id=param_issue_id))
 	
 	if not response.ok:
 		print ('Response error: ', response.status_code)
-		return
+		raise BaseException('Could not download the worklogs of the issue ' + str(param_issue_id))
 	
-	response_json = response.json()
+	return [convert_worklog(worklog) for worklog in response.json()['worklogs']]
+
+def convert_worklog(worklog):
+	''' Returns a Worklog record with the attributes of the worklog (as
+	returned by Jira) used by the report.'''
+
+	return make_worklog(
+		worklog['id'],
+		worklog['author']['displayName'], # full name
+		worklog['author']['name'], # Jira user
+		int(worklog['timeSpentSeconds']) / 3600,
+		worklog['comment'],
+		parse_jira_date(worklog['started']).day)
+
+def make_worklog(worklog_id, author, author_username, time_spent, comment, started):
+	''' Returns a Worklog record whose strings repeated in many worklogs
+	(author, author_username and started) are shared (interned), however
+	the worklog was read (from Jira or from the local store).'''
+
+	return Worklog(worklog_id, sys.intern(author), sys.intern(author_username),
+		time_spent, comment, sys.intern(started))
+
+def find_changed_worklog_ids(auth_code, url_template, since):
+	''' Returns the IDs of the worklogs listed by url_template (worklog/updated
+	or worklog/deleted) since the given time (milliseconds since epoch), and
+	the time to be used as since in the next request.'''
+
+	worklog_ids = []
+	url = url_template.substitute(jira_url=conf_jira_url, since=since)
+	until = since
+	while url:
+		response = jira_get(auth_code, url)
+		if not response.ok:
+			print_connection_error(response)
+			raise BaseException('Could not download the list of changed worklogs')
+		response_json = response.json()
+		worklog_ids.extend(str(value['worklogId']) for value in response_json['values'])
+		until = response_json.get('until', until)
+		url = None if response_json.get('lastPage', True) else response_json.get('nextPage')
 
-	worklogs = []
-	for worklog in response_json['worklogs']:
-		json = {}
-		json['author'] = worklog['author']['displayName'] # full name
-		json['author_username'] = worklog['author']['name'] # Jira user
-		json['timeSpent'] = int(worklog['timeSpentSeconds']) / 3600
-		json['comment'] = worklog['comment']
-		json['started'] = format_long_date_string(worklog['started'], False)
-		worklogs.append(json)
+	return worklog_ids, until
 
+def find_worklogs_by_ids(auth_code, worklog_ids):
+	''' Downloads the worklogs with the given IDs in batches of
+	WORKLOG_LIST_MAX_IDS. Returns a list of (issue's id, Worklog record).'''
+
+	def find_batch(batch):
+		response = jira_post(auth_code, URL_WORKLOG_LIST.substitute(jira_url=conf_jira_url), {'ids': [int(worklog_id) for worklog_id in batch]})
+		if not response.ok:
+			print_connection_error(response)
+			raise BaseException('Could not download the worklogs by ID')
+		return [(str(worklog['issueId']), convert_worklog(worklog)) for worklog in response.json()]
+
+	# the worklogs already downloaded by another report of the batch
+	worklogs = []
+	if jira_cache is not None:
+		missing_ids = []
+		for worklog_id in worklog_ids:
+			worklog = jira_cache.lookup(('worklog', worklog_id))
+			if worklog is None:
+				missing_ids.append(worklog_id)
+			else:
+				worklogs.append(worklog)
+		worklog_ids = missing_ids
+
+	batches = [worklog_ids[i:i + WORKLOG_LIST_MAX_IDS] for i in range(0, len(worklog_ids), WORKLOG_LIST_MAX_IDS)]
+	with ThreadPoolExecutor(max_workers=max(1, conf_worklogs_concurrency)) as executor:
+		for batch_worklogs in executor.map(find_batch, batches):
+			worklogs.extend(batch_worklogs)
+			if jira_cache is not None:
+				for worklog in batch_worklogs:
+					jira_cache.put(('worklog', str(worklog[1].id)), worklog)
 	return worklogs
 
+def find_worklogs_bulk(auth_code, issue_ids, since):
+	''' Downloads the worklogs updated since the given time (milliseconds
+	since epoch) that belong to the issues in issue_ids.
+	Returns a dict with the issue's id as key and the list of its worklogs
+	(in the shape returned by find_worklogs) as value, and the time to be
+	used as since in the next request.'''
+
+	print('Downloading worklogs updated since', since, '(bulk)...')
+	with metrics.phase('worklogs'):
+		worklog_ids, until = find_changed_worklog_ids(auth_code, URL_WORKLOG_UPDATED, since)
+		worklogs = find_worklogs_by_ids(auth_code, worklog_ids)
+
+	dict_issue_worklogs = {issue_id: [] for issue_id in issue_ids}
+	for issue_id, worklog in worklogs:
+		if issue_id in dict_issue_worklogs:
+			dict_issue_worklogs[issue_id].append(worklog)
+
+	# same order as the issue's worklog endpoint
+	for worklogs in dict_issue_worklogs.values():
+		worklogs.sort(key=lambda worklog: int(worklog.id))
+
+	print('Worklogs downloaded:', len(worklog_ids))
+	return dict_issue_worklogs, until
+
+
+def set_search_param(url_find_issues, name, value):
+	''' Returns url_find_issues with the query parameter name set to value.'''
+
+	scheme, netloc, path, query, fragment = urlsplit(url_find_issues)
+	params = [(param, param_value) for param, param_value in parse_qsl(query, keep_blank_values=True)
+		if param != name]
+	params.append((name, value))
+	return urlunsplit((scheme, netloc, path, urlencode(params), fragment))
+
+
+def add_jql_clause(url_find_issues, clause):
+	''' Returns url_find_issues with its JQL query restricted
+	by clause (e.g. 'updated >= "2019/04/01 19:59"').'''
+
+	scheme, netloc, path, query, fragment = urlsplit(url_find_issues)
+	params = parse_qsl(query, keep_blank_values=True)
+	jql = ''
+	other_params = []
+	for name, value in params:
+		if name == 'jql':
+			jql = value
+		else:
+			other_params.append((name, value))
+
+	# ORDER BY must stay at the end of the query
+	order_by = ''
+	pos_order_by = jql.upper().rfind('ORDER BY')
+	if pos_order_by >= 0:
+		order_by = ' ' + jql[pos_order_by:]
+		jql = jql[:pos_order_by]
+	jql = jql.strip()
+	jql = '(' + jql + ') AND ' + clause if jql else clause
+
+	query = urlencode([('jql', jql + order_by)] + other_params)
+	return urlunsplit((scheme, netloc, path, query, fragment))
+
+
+def open_jira_store(filter_id):
+	''' Opens (creating it if needed) the local store with the
+	filter's issues and worklogs.'''
+
+	# another report of the same filter may be writing to it
+	store = sqlite3.connect(BASE_DIR + JIRA_STORE_FILE.substitute(filter_id=filter_id), timeout=JIRA_TIMEOUT)
+	store.execute('CREATE TABLE IF NOT EXISTS issues (id TEXT PRIMARY KEY, data TEXT)')
+	store.execute('CREATE TABLE IF NOT EXISTS worklogs (id TEXT PRIMARY KEY, issue_id TEXT, data TEXT)')
+	store.execute('CREATE INDEX IF NOT EXISTS worklogs_issue_id ON worklogs (issue_id)')
+	store.execute('CREATE TABLE IF NOT EXISTS sync_state (name TEXT PRIMARY KEY, value TEXT)')
+	return store
+
+
+def find_parent_fix_versions(auth_code, parent_ids, full_refresh):
+	''' Returns a dict with the fix version of each issue in parent_ids ('' if it
+	has none or Jira didn't return it). Those checked less than conf_parent_cache_hours
+	ago are read from PARENT_CACHE_FILE (unless full_refresh is True) and the rest
+	are downloaded in searches of ISSUES_BY_ID_CHUNK issues.
+	Returns None if Jira answered with an error.'''
+
+	# another report of the batch may be using it
+	cache = sqlite3.connect(BASE_DIR + PARENT_CACHE_FILE, timeout=JIRA_TIMEOUT)
+	try:
+		cache.execute('CREATE TABLE IF NOT EXISTS parents (id TEXT PRIMARY KEY, fix_version TEXT, checked REAL)')
+
+		fix_versions = {}
+		if not full_refresh:
+			min_checked = time.time() - conf_parent_cache_hours * 3600
+			for i in range(0, len(parent_ids), STORE_READ_PAGE_SIZE):
+				chunk = parent_ids[i:i + STORE_READ_PAGE_SIZE]
+				rows = cache.execute('SELECT id, fix_version FROM parents WHERE checked >= ? AND id IN ('
+					+ ','.join('?' * len(chunk)) + ')', [min_checked] + chunk)
+				fix_versions.update(rows)
+
+		missing_ids = [parent_id for parent_id in parent_ids if parent_id not in fix_versions]
+		if missing_ids:
+			print('Downloading', len(missing_ids), 'parent issues not in the filter...')
+		# invalid IDs are ignored instead of failing the whole search
+		url_search = set_search_param(URL_SEARCH.substitute(jira_url=conf_jira_url), 'validateQuery', 'false')
+		for chunk, parents in iter_issues_by_id(auth_code, url_search, missing_ids, PARENT_FIELDS):
+			if parents is None:
+				return None
+
+			for parent_id in chunk:
+				fix_versions[parent_id] = ''
+			for parent in parents:
+				parent_versions = parent['fields'].get('fixVersions') or [{'name': ''}]
+				fix_versions[parent['id']] = parent_versions[0]['name']
+
+			checked = time.time()
+			cache.executemany('INSERT OR REPLACE INTO parents VALUES (?, ?, ?)',
+				[(parent_id, fix_versions[parent_id], checked) for parent_id in chunk])
+			cache.commit()
+
+		return fix_versions
+	finally:
+		cache.close()
+
+
+def get_jira_store_lock(filter_id):
+	''' Returns the lock that keeps two reports of a batch from synchronizing
+	the store of the same filter at the same time.'''
+
+	with jira_store_locks_lock:
+		return jira_store_locks.setdefault(filter_id, threading.Lock())
+
+
+def get_sync_state(store, name):
+	row = store.execute('SELECT value FROM sync_state WHERE name = ?', (name,)).fetchone()
+	return row[0] if row else None
+
+
+def set_sync_state(store, name, value):
+	store.execute('INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)', (name, value))
+
+
+def save_issues_in_store(store, issues):
+	''' Replaces the stored copy of issues.'''
+
+	store.executemany('INSERT OR REPLACE INTO issues (id, data) VALUES (?, ?)',
+		[(issue['id'], json.dumps(issue)) for issue in issues])
+
+
+def save_worklogs_in_store(store, dict_issue_worklogs, replace):
+	''' Saves the worklogs of each issue in dict_issue_worklogs. If replace
+	is True the previously stored worklogs of those issues are removed.'''
+
+	for issue_id, worklogs in dict_issue_worklogs.items():
+		if replace:
+			store.execute('DELETE FROM worklogs WHERE issue_id = ?', (issue_id,))
+		store.executemany(
+			'INSERT OR REPLACE INTO worklogs (id, issue_id, data) VALUES (?, ?, ?)',
+			[(worklog.id, issue_id, json.dumps(worklog._asdict())) for worklog in worklogs])
+
+
+def sync_worklogs_bulk(auth_code, store, issue_ids, since, deleted_since):
+	''' Applies to the store the worklogs of the issues in issue_ids updated
+	since the given time and the ones deleted since deleted_since (both in
+	milliseconds since epoch). Returns the times to be used as since and
+	deleted_since in the next sync.'''
+
+	dict_issue_worklogs, until = find_worklogs_bulk(auth_code, issue_ids, since)
+	save_worklogs_in_store(store, dict_issue_worklogs, False)
+
+	with metrics.phase('worklogs'):
+		deleted_ids, until_deleted = find_changed_worklog_ids(auth_code, URL_WORKLOG_DELETED, deleted_since)
+	store.executemany('DELETE FROM worklogs WHERE id = ?', [(worklog_id,) for worklog_id in deleted_ids])
+
+	return until, until_deleted
+
+
+def delete_issues_from_store(store, issue_ids):
+	for issue_id in issue_ids:
+		store.execute('DELETE FROM issues WHERE id = ?', (issue_id,))
+		store.execute('DELETE FROM worklogs WHERE issue_id = ?', (issue_id,))
+
+
+def calculate_high_water_mark(issues, previous_mark):
+	''' Returns the date (in JQL format) from which issues must be asked
+	for in the next incremental sync: the most recent update among
+	issues minus INCREMENTAL_SYNC_MARGIN.'''
+
+	last_updated = None
+	for issue in issues:
+		updated = datetime.strptime(issue['fields']['updated'], '%Y-%m-%dT%H:%M:%S.%f%z')
+		# JQL dates are expressed in the user's time zone, as the dates returned by Jira
+		updated = updated.replace(tzinfo=None)
+		if last_updated is None or updated > last_updated:
+			last_updated = updated
+
+	if last_updated is None:
+		return previous_mark
+
+	mark = (last_updated - INCREMENTAL_SYNC_MARGIN).strftime('%Y/%m/%d %H:%M')
+	if previous_mark and previous_mark > mark:
+		return previous_mark
+	return mark
+
+
+def sync_jira_store(auth_code, filter_id, full_refresh):
+	''' Brings the local store up to date with Jira downloading only the
+	issues updated since the last sync (every issue if full_refresh is True
+	or there was no previous sync), plus the issues that are in the filter
+	but not in the store. Issues no longer in the filter are removed.
+	Returns the IDs of the filter's issues (in the filter's order) or None
+	if Jira answered with an error.'''
+
+	url_find_issues = find_search_url(auth_code, filter_id)
+	if not url_find_issues:
+		return None
+
+	store = open_jira_store(filter_id)
+	try:
+		high_water_mark = get_sync_state(store, 'high_water_mark')
+		worklog_since = get_sync_state(store, 'worklog_since')
+		worklog_deleted_since = get_sync_state(store, 'worklog_deleted_since')
+		if full_refresh or get_sync_state(store, 'search_url') != url_find_issues:
+			# the filter's query changed: nothing stored can be trusted
+			high_water_mark = None
+		if conf_worklog_backend == 'bulk' and (worklog_since is None or worklog_deleted_since is None):
+			# the worklogs were not synchronized with the bulk backend before
+			high_water_mark = None
+
+		if high_water_mark is None:
+			print('Downloading all the issues (full sync)...')
+			changed_issues = find_issues(auth_code, url_find_issues)
+			if changed_issues is None:
+				return None
+			current_ids = [issue['id'] for issue in changed_issues]
+			stored_ids = set()
+		else:
+			print('Downloading issues updated since', high_water_mark, '(incremental sync)...')
+			filter_issues = find_issues(auth_code, url_find_issues, ['id'])
+			if filter_issues is None:
+				return None
+			current_ids = [issue['id'] for issue in filter_issues]
+
+			changed_issues = find_issues(auth_code,
+				add_jql_clause(url_find_issues, 'updated >= "' + high_water_mark + '"'))
+			if changed_issues is None:
+				return None
+
+			# issues that entered the filter without being updated (or missing in the store)
+			stored_ids = set(row[0] for row in store.execute('SELECT id FROM issues'))
+			changed_ids = set(issue['id'] for issue in changed_issues)
+			missing_ids = [issue_id for issue_id in current_ids
+				if issue_id not in stored_ids and issue_id not in changed_ids]
+			missing_issues = find_issues_by_id(auth_code, url_find_issues, missing_ids)
+			if missing_issues is None:
+				return None
+			changed_issues.extend(missing_issues)
+
+		if high_water_mark is None:
+			store.execute('DELETE FROM issues')
+			store.execute('DELETE FROM worklogs')
+		save_issues_in_store(store, changed_issues)
+
+		if conf_worklog_backend == 'bulk' and high_water_mark is not None:
+			# the issues new in the store may have worklogs older than the last sync
+			new_issues = [issue for issue in changed_issues if issue['id'] not in stored_ids]
+			save_worklogs_in_store(store, find_worklogs_by_issue(auth_code, new_issues), True)
+			worklog_since, worklog_deleted_since = sync_worklogs_bulk(
+				auth_code, store, current_ids, int(worklog_since), int(worklog_deleted_since))
+			set_sync_state(store, 'worklog_since', str(worklog_since))
+			set_sync_state(store, 'worklog_deleted_since', str(worklog_deleted_since))
+		else:
+			# worklog/updated lists the whole instance: in a full sync it would page through
+			# every worklog changed since the oldest issue was created, so they are downloaded
+			# by issue and the bulk backend starts from now on
+			sync_start = int((time.time() - INCREMENTAL_SYNC_MARGIN.total_seconds()) * 1000)
+			save_worklogs_in_store(store, find_worklogs_by_issue(auth_code, changed_issues), True)
+			if conf_worklog_backend == 'bulk':
+				set_sync_state(store, 'worklog_since', str(sync_start))
+				set_sync_state(store, 'worklog_deleted_since', str(sync_start))
+
+		current_id_set = set(current_ids)
+		removed_ids = [row[0] for row in store.execute('SELECT id FROM issues') if row[0] not in current_id_set]
+		delete_issues_from_store(store, removed_ids)
+
+		set_sync_state(store, 'search_url', url_find_issues)
+		set_sync_state(store, 'high_water_mark', calculate_high_water_mark(changed_issues, high_water_mark))
+		# the filter's order, for update_store_issues
+		set_sync_state(store, 'issue_ids', json.dumps(current_ids))
+		store.commit()
+
+		print('Issues updated:', len(changed_issues), '- removed from filter:', len(removed_ids))
+		return current_ids
+	finally:
+		store.close()
+
+
+def update_store_issues(auth_code, filter_id, issue_ids):
+	''' Downloads again the issues in issue_ids that are in the filter, and
+	their worklogs, and removes from the store the ones that are not anymore
+	(or were deleted) without a full sync of the filter (see sync_jira_store,
+	that is run instead if the filter was never synchronized). Issues that
+	entered the filter are placed at its end until the next sync.
+	The parents (in the filter) of the sub-tasks among them are downloaded
+	again too: their aggregate times include the sub-tasks' ones.
+	Returns the IDs of the filter's issues and the IDs of the issues
+	downloaded again, or None twice if Jira answered with an error.'''
+
+	store = open_jira_store(filter_id)
+	try:
+		url_find_issues = get_sync_state(store, 'search_url')
+		stored_ids = get_sync_state(store, 'issue_ids')
+		if url_find_issues is not None and stored_ids is not None:
+			current_ids = json.loads(stored_ids)
+			current_id_set = set(current_ids)
+			# deleted issues are ignored instead of failing the whole search
+			url_find_issues = set_search_param(url_find_issues, 'validateQuery', 'false')
+			issue_ids = sorted(set(issue_ids))
+
+			changed_issues = find_issues_by_id(auth_code, url_find_issues, issue_ids)
+			if changed_issues is None:
+				return None, None
+			changed_ids = set(issue['id'] for issue in changed_issues)
+			removed_ids = set(issue_id for issue_id in issue_ids if issue_id not in changed_ids)
+
+			# the stored copies cover the sub-tasks deleted or moved to another parent
+			stored_issues = [json.loads(row[0]) for row in store.execute(
+				'SELECT data FROM issues WHERE id IN (' + ','.join('?' * len(issue_ids)) + ')', issue_ids)]
+			parent_ids = set(issue['fields']['parent']['id'] for issue in stored_issues + changed_issues
+				if issue['fields'].get('parent')) & current_id_set
+			parent_issues = find_issues_by_id(auth_code, url_find_issues, sorted(parent_ids - set(issue_ids)))
+			if parent_issues is None:
+				return None, None
+			changed_issues.extend(parent_issues)
+
+			save_issues_in_store(store, changed_issues)
+			save_worklogs_in_store(store, find_worklogs_by_issue(auth_code, changed_issues), True)
+			delete_issues_from_store(store, removed_ids)
+
+			current_ids = [issue_id for issue_id in current_ids if issue_id not in removed_ids]
+			current_ids.extend(issue['id'] for issue in changed_issues if issue['id'] not in current_id_set)
+			set_sync_state(store, 'issue_ids', json.dumps(current_ids))
+			store.commit()
+
+			print('Issues updated:', len(changed_issues), '- removed from filter:', len(removed_ids & current_id_set))
+			return current_ids, frozenset(issue['id'] for issue in changed_issues)
+	finally:
+		store.close()
+
+	current_ids = sync_jira_store(auth_code, filter_id, False)
+	return current_ids, frozenset(current_ids or ())
+
+
+def iter_store_pages(filter_id, issue_ids, skip_ids=frozenset()):
+	''' Generator that reads from the local store the issues in issue_ids
+	and yields them (in the same order) page by page, together with a
+	dict with the worklogs of each issue. The issues in skip_ids are not
+	read (they are yielded as {'id': issue_id}, without worklogs).'''
+
+	store = open_jira_store(filter_id)
+	try:
+		page_size = min(conf_page_size, STORE_READ_PAGE_SIZE)
+		for i in range(0, len(issue_ids), page_size):
+			page_ids = issue_ids[i:i + page_size]
+			read_ids = [issue_id for issue_id in page_ids if issue_id not in skip_ids]
+			placeholders = ','.join('?' * len(read_ids))
+
+			dict_stored_issues = {}
+			dict_issue_worklogs = {issue_id: [] for issue_id in read_ids}
+			if read_ids:
+				for issue_id, data in store.execute(
+					'SELECT id, data FROM issues WHERE id IN (' + placeholders + ')', read_ids):
+					dict_stored_issues[issue_id] = json.loads(data)
+
+				for issue_id, data in store.execute(
+					'SELECT issue_id, data FROM worklogs WHERE issue_id IN (' + placeholders + ')' +
+					' ORDER BY CAST(id AS INTEGER)', read_ids):
+					stored = json.loads(data)
+					dict_issue_worklogs[issue_id].append(make_worklog(*(stored[field] for field in Worklog._fields)))
+
+			yield [dict_stored_issues.get(issue_id) or {'id': issue_id} for issue_id in page_ids], dict_issue_worklogs
+	finally:
+		store.close()
+
+
+class JiraCache:
+	''' Worklogs downloaded during a batch, shared by its reports so the
+	ones of an issue that is in several filters are downloaded once. If a
+	report asks for something another one is downloading, it waits for it.
+	Can be shared between threads.'''
+
+	def __init__(self):
+		self.entries = {} # key -> Future with the value
+		self.lock = threading.Lock()
+
+	def get(self, key, download):
+		''' Returns the value of key, calling download() to obtain it
+		if no other report did it before.'''
+
+		with self.lock:
+			future = self.entries.get(key)
+			downloader = future is None
+			if downloader:
+				future = Future()
+				self.entries[key] = future
+
+		if downloader:
+			try:
+				future.set_result(download())
+			except BaseException as e:
+				# the next report will try again
+				with self.lock:
+					del self.entries[key]
+				future.set_exception(e)
+		return future.result()
+
+	def lookup(self, key):
+		''' Returns the value of key if it was already downloaded (None otherwise).'''
+
+		with self.lock:
+			future = self.entries.get(key)
+		if future is None or not future.done() or future.exception():
+			return None
+		return future.result()
+
+	def put(self, key, value):
+		future = Future()
+		future.set_result(value)
+		with self.lock:
+			self.entries[key] = future
+
+
+class RunMetrics:
+	''' Measures of a run of the reports: time spent in each phase, requests
+	sent to Jira and Sheets (per endpoint: count, errors, retries, response
+	bytes and a latency histogram), rows written to each tab, and issues
+	analyzed and result of each report. Can be shared between threads.
+
+	Phases are measured with phase(name). When a phase starts inside another
+	one (in the same thread) the time is counted only for the inner phase,
+	so the phases of a report add up to its duration (the reports of a batch
+	loaded at the same time add up their phases).'''
+
+	def __init__(self):
+		self.started = datetime.now()
+		self.start = time.perf_counter()
+		self.seconds = 0
+		self.success = False
+		self.phases = {}
+		self.requests = {'jira': {}, 'sheets': {}}
+		self.reports = {} # report name -> issues, worklogs, seconds and loaded
+		self.tabs = {} # report name -> tab -> seconds, rows and rows_sent
+		self.rules = {} # report name -> validation rule -> seconds and hits
+		self.issues = 0
+		self.worklogs = 0
+		self.lock = threading.Lock()
+		self.local = threading.local()
+
+	@contextlib.contextmanager
+	def phase(self, name):
+		stack = self.local.__dict__.setdefault('phases', [])
+		now = time.perf_counter()
+		if stack:
+			# the outer phase is paused
+			self.add_phase_time(stack[-1][0], now - stack[-1][1])
+		stack.append([name, now])
+		try:
+			yield
+		finally:
+			now = time.perf_counter()
+			name, start = stack.pop()
+			self.add_phase_time(name, now - start)
+			if stack:
+				stack[-1][1] = now
+
+	def add_phase_time(self, name, seconds):
+		with self.lock:
+			self.phases[name] = self.phases.get(name, 0) + seconds
+
+	def record_request(self, service, endpoint, seconds, retries, ok, num_bytes=0):
+		with self.lock:
+			endpoint_metrics = self.requests[service].get(endpoint)
+			if endpoint_metrics is None:
+				endpoint_metrics = {'requests': 0, 'errors': 0, 'retries': 0, 'bytes': 0, 'seconds': 0,
+					'buckets': [0] * len(METRICS_LATENCY_BUCKETS)}
+				self.requests[service][endpoint] = endpoint_metrics
+			endpoint_metrics['requests'] += 1
+			endpoint_metrics['errors'] += 0 if ok else 1
+			endpoint_metrics['retries'] += retries
+			endpoint_metrics['bytes'] += num_bytes
+			endpoint_metrics['seconds'] += seconds
+			for i, bucket in enumerate(METRICS_LATENCY_BUCKETS):
+				if seconds <= bucket:
+					endpoint_metrics['buckets'][i] += 1
+
+	def record_jira_response(self, response, seconds):
+		''' Records a request to Jira. The retries done by the session are in the response.'''
+
+		retries = getattr(response.raw, 'retries', None)
+		num_retries = len(retries.history) if retries else 0
+		self.record_request('jira', jira_endpoint(response.url), seconds, num_retries, response.ok)
+
+	def record_response_bytes(self, response):
+		''' Adds the bytes received (compressed) of a response already read.'''
+
+		with self.lock:
+			self.requests['jira'][jira_endpoint(response.url)]['bytes'] += response.raw.tell()
+
+	def record_tab(self, report_name, tab, seconds, rows, rows_sent):
+		with self.lock:
+			tab_metrics = self.tabs.setdefault(report_name, {}).setdefault(tab, {'seconds': 0, 'rows': 0, 'rows_sent': 0})
+			tab_metrics['seconds'] += seconds
+			tab_metrics['rows'] += rows
+			tab_metrics['rows_sent'] += rows_sent
+
+	def record_rule(self, report_name, rule_name, seconds, hits):
+		with self.lock:
+			self.rules.setdefault(report_name, {})[rule_name] = {'seconds': round(seconds, 6), 'hits': hits}
+
+	def get_report(self, report_name):
+		return self.reports.setdefault(report_name, {'issues': 0, 'worklogs': 0, 'seconds': 0, 'loaded': None})
+
+	def count_issues(self, report_name, num_issues, num_worklogs):
+		with self.lock:
+			report_metrics = self.get_report(report_name)
+			report_metrics['issues'] += num_issues
+			report_metrics['worklogs'] += num_worklogs
+			self.issues += num_issues
+			self.worklogs += num_worklogs
+
+	def record_report(self, report_name, loaded, seconds):
+		''' Records the result of a report: True if loaded, False if not
+		(the script's version is not valid) and None if it failed.'''
+
+		with self.lock:
+			report_metrics = self.get_report(report_name)
+			report_metrics['loaded'] = loaded
+			report_metrics['seconds'] = round(seconds, 3)
+
+	def finish(self):
+		self.seconds = time.perf_counter() - self.start
+
+	def to_json(self):
+		return {
+			'started': self.started.isoformat(timespec='seconds'),
+			'seconds': round(self.seconds, 3),
+			'success': self.success,
+			'issues': self.issues,
+			'worklogs': self.worklogs,
+			'issues_per_second': round(self.issues / self.seconds, 3) if self.seconds else 0,
+			'phases': {name: round(seconds, 3) for name, seconds in self.phases.items()},
+			'requests': self.requests,
+			'latency_buckets': list(METRICS_LATENCY_BUCKETS),
+			'reports': self.reports,
+			'tabs': self.tabs,
+			'rules': self.rules}
+
+	def to_prometheus(self):
+		''' Returns the measures in the Prometheus text format.'''
+
+		lines = []
+		def add(name, metric_type, help_text, samples):
+			lines.append('# HELP ' + METRICS_PREFIX + name + ' ' + help_text)
+			lines.append('# TYPE ' + METRICS_PREFIX + name + ' ' + metric_type)
+			for suffix, labels, value in samples:
+				label_str = ','.join(key + '="' + str(label).replace('\\', '\\\\').replace('"', '\\"') + '"'
+					for key, label in labels)
+				if label_str:
+					label_str = '{' + label_str + '}'
+				lines.append(METRICS_PREFIX + name + suffix + label_str + ' ' + str(value))
+
+		add('last_run_timestamp_seconds', 'gauge', 'When the last run started.', [('', [], self.started.timestamp())])
+		add('last_run_success', 'gauge', 'Whether the last run loaded every report.', [('', [], 1 if self.success else 0)])
+		add('run_seconds', 'gauge', 'Duration of the last run.', [('', [], self.seconds)])
+		add('issues', 'gauge', 'Issues analyzed in the last run.', [('', [], self.issues)])
+		add('worklogs', 'gauge', 'Worklogs analyzed in the last run.', [('', [], self.worklogs)])
+		add('issues_per_second', 'gauge', 'Issues analyzed per second in the last run.',
+			[('', [], self.issues / self.seconds if self.seconds else 0)])
+		add('phase_seconds', 'gauge', 'Time spent in each phase of the last run.',
+			[('', [('phase', name)], seconds) for name, seconds in self.phases.items()])
+
+		reports = sorted(self.reports.items())
+		add('report_loaded', 'gauge', 'Whether each report was loaded in the last run.',
+			[('', [('report', name)], 1 if report_metrics['loaded'] else 0) for name, report_metrics in reports])
+		add('report_seconds', 'gauge', 'Time spent loading each report in the last run.',
+			[('', [('report', name)], report_metrics['seconds']) for name, report_metrics in reports])
+		add('report_issues', 'gauge', 'Issues analyzed for each report in the last run.',
+			[('', [('report', name)], report_metrics['issues']) for name, report_metrics in reports])
+
+		for service, endpoints in self.requests.items():
+			items = sorted(endpoints.items())
+			histogram = []
+			for endpoint, endpoint_metrics in items:
+				labels = [('endpoint', endpoint)]
+				for bucket, count in zip(METRICS_LATENCY_BUCKETS, endpoint_metrics['buckets']):
+					histogram.append(('_bucket', labels + [('le', bucket)], count))
+				histogram.append(('_bucket', labels + [('le', '+Inf')], endpoint_metrics['requests']))
+				histogram.append(('_sum', labels, endpoint_metrics['seconds']))
+				histogram.append(('_count', labels, endpoint_metrics['requests']))
+			add(service + '_request_duration_seconds', 'histogram',
+				'Latency of the requests to ' + service.capitalize() + ' in the last run.', histogram)
+			counters = [('errors', 'errors', 'Failed requests to '), ('retries', 'retries', 'Retries of the requests to ')]
+			if service == 'jira':
+				counters.append(('bytes', 'response_bytes', 'Bytes (compressed) received from '))
+			for counter, name, help_text in counters:
+				add(service + '_' + name, 'gauge', help_text + service.capitalize() + ' in the last run.',
+					[('', [('endpoint', endpoint)], endpoint_metrics[counter]) for endpoint, endpoint_metrics in items])
+
+		tabs = [([('report', report_name), ('tab', tab)], tab_metrics)
+			for report_name, report_tabs in sorted(self.tabs.items()) for tab, tab_metrics in report_tabs.items()]
+		add('tab_seconds', 'gauge', 'Time spent writing each tab in the last run.',
+			[('', labels, tab_metrics['seconds']) for labels, tab_metrics in tabs])
+		add('tab_rows', 'gauge', 'Rows of each tab after the last run.',
+			[('', labels, tab_metrics['rows']) for labels, tab_metrics in tabs])
+		add('tab_rows_sent', 'gauge', 'Rows of each tab uploaded in the last run.',
+			[('', labels, tab_metrics['rows_sent']) for labels, tab_metrics in tabs])
+
+		rules = [([('report', report_name), ('rule', rule_name)], rule_metrics)
+			for report_name, report_rules in sorted(self.rules.items()) for rule_name, rule_metrics in report_rules.items()]
+		add('rule_seconds', 'gauge', 'Time spent evaluating each validation rule in the last run.',
+			[('', labels, rule_metrics['seconds']) for labels, rule_metrics in rules])
+		add('rule_hits', 'gauge', 'Issues that matched each validation rule in the last run.',
+			[('', labels, rule_metrics['hits']) for labels, rule_metrics in rules])
+
+		return '\n'.join(lines) + '\n'
+
+# measures of the current run (replaced by run_main)
+metrics = RunMetrics()
+
+
+def jira_endpoint(url):
+	''' Returns the path of url relative to conf_jira_url with the IDs
+	replaced by {id} (like '/rest/api/2/issue/{id}/worklog').'''
+
+	path = urlsplit(url).path
+	base_path = urlsplit(conf_jira_url).path
+	if path.startswith(base_path):
+		path = path[len(base_path):]
+	return re.sub(r'(?<!/api)/\d+', '/{id}', path).rstrip('/')
+
+
+def export_metrics(run_metrics):
+	''' Writes the measures of the run to conf_metrics_file and conf_prometheus_file.
+	The Prometheus file is replaced at once so the collector never reads it half written.'''
+
+	if conf_metrics_file:
+		with open(os.path.join(BASE_DIR, conf_metrics_file), 'w') as f:
+			json.dump(run_metrics.to_json(), f, indent='\t')
+
+	if conf_prometheus_file:
+		path = os.path.join(BASE_DIR, conf_prometheus_file)
+		with open(path + '.tmp', 'w') as f:
+			f.write(run_metrics.to_prometheus())
+		os.replace(path + '.tmp', path)
+
+	print('Run finished in', round(run_metrics.seconds, 1), 'seconds:',
+		', '.join(name + ' ' + str(round(seconds, 1)) + 's' for name, seconds in run_metrics.phases.items()))
+
 
 def format_long_date_string(str_date, onlyYearMonth):
 	''' node: a date-string in format '2019-04-01T19:59:00.000+0200'
 	returns: a date string with format '01/04/2019' if onlyYearMonth is
 	False, otherwise '2019/04' will be returned.'''
 
-	if str_date is None or len(str_date) == 0:
-		d = ''
-	else:
-		resultDateMask = '%Y/%m' if onlyYearMonth else '%d/%m/%Y'
-		d = datetime.strptime(str_date, '%Y-%m-%dT%H:%M:%S.%f%z').strftime(resultDateMask)
-		
-	return d
+	jira_date = parse_jira_date(str_date)
+	return jira_date.month if onlyYearMonth else jira_date.day
+
+
+def parse_jira_date(str_date):
+	''' Returns the JiraDate of a date-string in format '2019-04-01T19:59:00.000+0200'
+	(the date as written, in the string's time zone). Empty for None or ''.'''
+
+	if not str_date:
+		return JiraDate('', '', None)
+	# many issues and worklogs share the day, which is all that is read
+	return parse_jira_day(str_date[:10])
+
+
+@functools.lru_cache(maxsize=JIRA_DATE_CACHE_SIZE)
+def parse_jira_day(str_day):
+	''' Returns the JiraDate of a day in format '2019-04-01'.'''
+
+	# date() fails with a malformed day as strptime did
+	day = date(int(str_day[0:4]), int(str_day[5:7]), int(str_day[8:10]))
+	return JiraDate(
+		sys.intern(str_day[8:10] + '/' + str_day[5:7] + '/' + str_day[0:4]),
+		sys.intern(str_day[0:4] + '/' + str_day[5:7]),
+		day.toordinal())
 
 
 def get_auth_code(user, password):
@@ -500,22 +2656,162 @@ def get_auth_code(user, password):
 	return auth_code
 
 
-def load_config():
-	''' Reads configuration info from file.'''
+class ReportConfig:
+	''' Settings of a report, that may differ between the reports of a batch.
+	filter_id is the ID of the filter in Jira that provides the tasks to be
+	analyzed and team the Jira users of the team (used to determine if all the
+	people that worked in an issue were from the team). If the assigned person's
+	spentTime in the issue represents lower percentage than
+	percentage_shared_issue the issue is considered as shared.
+	google_sheet_key is the key of the report's Google Sheet (the long ID in its
+	URL; if empty it's opened by GOOGLE_SHEET_NAME, which makes Drive search every
+	file the account can see). name identifies the report in the measures and
+	in its snapshot file (the filter's ID by default).'''
+
+	def __init__(self, filter_id=123456, team=None, percentage_shared_issue=0.95, google_sheet_key='', name=None):
+		self.filter_id = filter_id
+		self.team = team if team is not None else []
+		self.percentage_shared_issue = percentage_shared_issue
+		self.google_sheet_key = google_sheet_key
+		self.name = name or str(filter_id)
+
+
+def report_from_config(conf, defaults=None):
+	''' Returns the ReportConfig defined by conf (a dict with the keys of
+	config.json: filterId, team, sharedPercentage and googleSheetKey, plus
+	name). The missing keys are taken from defaults (another ReportConfig).'''
+
+	if defaults is None:
+		defaults = ReportConfig()
+	return ReportConfig(
+		filter_id=conf.get('filterId', defaults.filter_id),
+		team=conf.get('team', defaults.team),
+		percentage_shared_issue=conf.get('sharedPercentage', defaults.percentage_shared_issue),
+		google_sheet_key=conf.get('googleSheetKey', defaults.google_sheet_key),
+		name=conf.get('name'))
+
+
+def load_reports(reports_file, default_report):
+	''' Reads the reports of a batch from reports_file (relative to BASE_DIR):
+	a JSON list with the settings of each report (see report_from_config).
+	The settings missing in a report are taken from default_report.'''
+
+	with open(os.path.join(BASE_DIR, reports_file)) as f:
+		reports = [report_from_config(conf, default_report) for conf in json.load(f)]
+
+	names = [report.name for report in reports]
+	if len(set(names)) != len(names):
+		print('Every report must have a different name (reports of the same filter need one):', names)
+		raise BaseException('Repeated report names in ' + reports_file)
+	return reports
+
 
-	global conf_percentage_shared_issue
-	global conf_filter_id
-	global conf_team
+def load_config():
+	''' Reads configuration info from file. Returns the configuration
+	(the settings of the report are read by report_from_config).'''
+
+	global conf_jira_url
+	global conf_reports_concurrency
+	global conf_worklogs_concurrency
+	global conf_page_size
+	global conf_parallel_pages
+	global conf_pages_concurrency
+	global conf_extra_fields
+	global conf_upload_chunk_rows
+	global conf_differential_upload
+	global conf_sheets_requests_per_minute
+	global conf_max_rows_per_tab
+	global conf_pivot_tabs
+	global conf_max_retries
+	global conf_requests_per_second
+	global conf_incremental_sync
+	global conf_worklog_backend
+	global conf_metrics_file
+	global conf_prometheus_file
+	global conf_parent_cache_hours
+	global conf_disabled_rules
+	global conf_custom_rules
+	global conf_rule_evaluation
+	global conf_aggregate_tabs
+	global conf_service_host
+	global conf_service_port
+	global conf_webhook_secret
+	global conf_service_debounce_seconds
+	global conf_service_max_delay_seconds
+	global conf_service_sweep_minutes
 	conf = {}
 	with open(BASE_DIR + CONFIG_FILE) as f:
 		conf = json.load(f)
 	
-	if 'sharedPercentage' in conf:
-		conf_percentage_shared_issue = conf['sharedPercentage']
-	if 'filterId' in conf:
-		conf_filter_id = conf['filterId']
-	if 'team' in conf:
-		conf_team = conf['team']
+	if 'jiraUrl' in conf:
+		conf_jira_url = conf['jiraUrl'].rstrip('/')
+	if 'reportsConcurrency' in conf:
+		conf_reports_concurrency = int(conf['reportsConcurrency'])
+	if 'worklogsConcurrency' in conf:
+		conf_worklogs_concurrency = int(conf['worklogsConcurrency'])
+	if 'pageSize' in conf:
+		conf_page_size = int(conf['pageSize'])
+	if 'parallelPages' in conf:
+		conf_parallel_pages = conf['parallelPages']
+	if 'pagesConcurrency' in conf:
+		conf_pages_concurrency = int(conf['pagesConcurrency'])
+	if 'extraFields' in conf:
+		conf_extra_fields = conf['extraFields']
+	if 'uploadChunkRows' in conf:
+		conf_upload_chunk_rows = int(conf['uploadChunkRows'])
+	if 'differentialUpload' in conf:
+		conf_differential_upload = conf['differentialUpload']
+	if 'sheetsRequestsPerMinute' in conf:
+		conf_sheets_requests_per_minute = int(conf['sheetsRequestsPerMinute'])
+	if 'maxRowsPerTab' in conf:
+		conf_max_rows_per_tab = int(conf['maxRowsPerTab'])
+	if 'pivotTabs' in conf:
+		conf_pivot_tabs = conf['pivotTabs']
+	if 'maxRetries' in conf:
+		conf_max_retries = int(conf['maxRetries'])
+	if 'requestsPerSecond' in conf:
+		conf_requests_per_second = float(conf['requestsPerSecond'])
+		if conf_requests_per_second < 0:
+			print('requestsPerSecond must be 0 (no limit) or positive:', conf['requestsPerSecond'])
+			raise BaseException('Wrong requestsPerSecond in ' + CONFIG_FILE)
+	if 'incrementalSync' in conf:
+		conf_incremental_sync = conf['incrementalSync']
+	if 'worklogBackend' in conf:
+		conf_worklog_backend = conf['worklogBackend']
+	if 'metricsFile' in conf:
+		conf_metrics_file = conf['metricsFile']
+	if 'prometheusFile' in conf:
+		conf_prometheus_file = conf['prometheusFile']
+	if 'parentCacheHours' in conf:
+		conf_parent_cache_hours = conf['parentCacheHours']
+	if 'disabledRules' in conf:
+		conf_disabled_rules = conf['disabledRules']
+	if 'customRules' in conf:
+		conf_custom_rules = conf['customRules']
+	if 'ruleEvaluation' in conf:
+		conf_rule_evaluation = conf['ruleEvaluation']
+	if 'aggregateTabs' in conf:
+		conf_aggregate_tabs = conf['aggregateTabs']
+	if 'serviceHost' in conf:
+		conf_service_host = conf['serviceHost']
+	if 'servicePort' in conf:
+		conf_service_port = int(conf['servicePort'])
+	if 'webhookSecret' in conf:
+		conf_webhook_secret = conf['webhookSecret']
+	if 'serviceDebounceSeconds' in conf:
+		conf_service_debounce_seconds = conf['serviceDebounceSeconds']
+	if 'serviceMaxDelaySeconds' in conf:
+		conf_service_max_delay_seconds = conf['serviceMaxDelaySeconds']
+	if 'serviceSweepMinutes' in conf:
+		conf_service_sweep_minutes = conf['serviceSweepMinutes']
+
+	if conf_worklog_backend == 'bulk' and not conf_incremental_sync:
+		print('The bulk worklog backend needs incrementalSync: worklogs are downloaded by issue')
+
+	# a wrong rule stops the run before anything is downloaded
+	get_validation_rules()
+
+	return conf
 
 
 def read_credentials():
@@ -549,7 +2845,18 @@ def build_pagination_str(init_pos, max_res):
 
 # Runs the "main" method if this .py file is executed directly:
 if __name__ == "__main__":
-	run_main()
+	parser = argparse.ArgumentParser(description='Loads data from Jira to the Google Sheet report.')
+	parser.add_argument('--full', action='store_true',
+		help='discard the local store of the incremental sync and the snapshot of the differential upload and load everything again')
+	parser.add_argument('--reports', metavar='FILE',
+		help='load every report defined in FILE (JSON in the config directory) instead of the one in ' + CONFIG_FILE)
+	parser.add_argument('--serve', action='store_true',
+		help="keep running and load the issues changed as Jira's webhook notifies them (see ReportService)")
+	args = parser.parse_args()
+	if args.serve:
+		ReportService(args.reports).serve_forever()
+	else:
+		run_main(full_refresh=args.full, reports_file=args.reports)
 	
 
 
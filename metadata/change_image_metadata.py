@@ -1,26 +1,323 @@
-# This script allows to change the creation date of an image
+# This script allows to change the creation date of images
+# (EXIF's DateTimeOriginal and DateTimeDigitized) of whole directory trees
+# The dates are overwritten in place when the image already has them (only
+# a few KB of the file are read and written), otherwise the image is
+# written again with piexif
 
 # Install piexif
 
 # Author: Paco Abato - pacoabato@gmail.com
 
+# examples:
+# python change_image_metadata.py --date "2019:08:16 19:00:00" example.jpg
+# python change_image_metadata.py --shift=-1h --dry-run photos/
+# python change_image_metadata.py --from-name photos/ --workers 8
+
+import argparse
+import functools
+import mmap
+import os
+import re
+import struct
+import sys
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+
 import piexif
 
-ifile = 'example.jpg'
+import media_files
+
+
+EXIF_DATE_FORMAT = '%Y:%m:%d %H:%M:%S'
+
+IMAGE_EXTENSIONS = ['.jpg', '.jpeg']
+
+# tags of the Exif IFD changed
+DATE_TAGS = [piexif.ExifIFD.DateTimeOriginal, piexif.ExifIFD.DateTimeDigitized]
+
+# JPEG markers: start of image, APP1 (Exif), start of scan, end of image
+JPEG_SOI = b'\xff\xd8'
+JPEG_APP1 = 0xE1
+JPEG_SOS = 0xDA
+JPEG_EOI = 0xD9
+EXIF_HEADER = b'Exif\x00\x00'
+# EXIF's dates are ASCII values of 20 bytes ('YYYY:MM:DD HH:MM:SS' and a NUL)
+TIFF_TYPE_ASCII = 2
+EXIF_DATE_LENGTH = 20
+
+# dates in file names like IMG_20190816_190000.jpg or 2019-08-16 19.00.00.jpg
+# (the time is optional: midnight is used)
+FILENAME_DATE_PATTERN = (r'(?P<year>(?:19|20)\d\d)[-_.]?(?P<month>[01]\d)[-_.]?(?P<day>[0-3]\d)'
+	r'(?:[-_. T]?(?P<hour>[0-2]\d)[-_.:]?(?P<minute>[0-5]\d)[-_.:]?(?P<second>[0-5]\d))?')
+
+# +1d, -2h30m, +90s...
+SHIFT_PATTERN = r'([+-]?)(?:(\d+)d)?(?:(\d+)h)?(?:(\d+)m)?(?:(\d+)s)?'
+
+# files sent to each worker at once
+WORKER_CHUNK_SIZE = 64
+
+# status: 'changed' (or would be changed in a dry run), 'skipped' or 'error'
+ImageResult = namedtuple('ImageResult', ['path', 'status', 'previous', 'current', 'message'])
+
+
+def parse_shift(text):
+	''' Returns the timedelta of a shift like +1d, -2h30m or +90s.'''
+
+	match = re.fullmatch(SHIFT_PATTERN, text.strip())
+	if match is None or not any(match.groups()[1:]):
+		raise ValueError('Wrong shift (use something like +1d, -2h30m or +90s): ' + text)
+	sign, days, hours, minutes, seconds = match.groups()
+	shift = timedelta(days=int(days or 0), hours=int(hours or 0),
+		minutes=int(minutes or 0), seconds=int(seconds or 0))
+	return -shift if sign == '-' else shift
+
+
+def check_date(text):
+	''' Returns the date if it is in EXIF_DATE_FORMAT (raises ValueError otherwise).'''
+
+	datetime.strptime(text, EXIF_DATE_FORMAT)
+	return text
+
+
+def date_from_name(path, pattern=FILENAME_DATE_PATTERN):
+	''' Returns the date (in EXIF_DATE_FORMAT) in the name of the file or
+	None if it has none. pattern must have the groups year, month and day
+	and may have hour, minute and second.'''
+
+	match = re.search(pattern, os.path.basename(path))
+	if match is None:
+		return None
+	parts = match.groupdict()
+	try:
+		found = datetime(int(parts['year']), int(parts['month']), int(parts['day']),
+			int(parts.get('hour') or 0), int(parts.get('minute') or 0), int(parts.get('second') or 0))
+	except ValueError:
+		return None
+	return found.strftime(EXIF_DATE_FORMAT)
+
+
+def read_exif_date(exif_dict):
+	''' Returns the date the image was taken (DateTimeOriginal or, if it
+	hasn't it, DateTimeDigitized or DateTime) or None.'''
+
+	for ifd, tag in [('Exif', piexif.ExifIFD.DateTimeOriginal),
+			('Exif', piexif.ExifIFD.DateTimeDigitized), ('0th', piexif.ImageIFD.DateTime)]:
+		value = exif_dict.get(ifd, {}).get(tag)
+		if value:
+			return value.decode('ascii', 'replace').strip('\x00 ')
+	return None
+
+
+def get_target_date(path, previous, date=None, shift=None, name_pattern=None):
+	''' Returns the new date of an image (from the first of date, shift
+	applied to its previous date or the date in its name that is given) or
+	None if it can't be worked out.'''
+
+	if date is not None:
+		return date
+	if shift is not None:
+		if previous is None:
+			return None
+		try:
+			return (datetime.strptime(previous, EXIF_DATE_FORMAT) + shift).strftime(EXIF_DATE_FORMAT)
+		except ValueError:
+			return None
+	if name_pattern is not None:
+		return date_from_name(path, name_pattern)
+	return None
+
+
+def find_ifd_entries(data, tiff, end, ifd_offset):
+	''' Returns a dict with the position (in data) of the 12 bytes entry of
+	each tag of the IFD at ifd_offset of the TIFF structure that starts at
+	tiff, and the byte order of the structure.'''
+
+	endian = '<' if data[tiff:tiff + 2] == b'II' else '>'
+	position = tiff + ifd_offset
+	if position + 2 > end:
+		return {}, endian
+	count = struct.unpack_from(endian + 'H', data, position)[0]
+	if position + 2 + count * 12 > end:
+		return {}, endian
+	entries = {}
+	for i in range(count):
+		entry = position + 2 + i * 12
+		entries[struct.unpack_from(endian + 'H', data, entry)[0]] = entry
+	return entries, endian
+
+
+def find_exif_date_offsets(data):
+	''' Returns a dict with the position (in data, a JPEG) of the value of
+	each date tag (DateTime, DateTimeOriginal and DateTimeDigitized) that
+	can be overwritten in place: ASCII of EXIF_DATE_LENGTH bytes.'''
+
+	if data[:2] != JPEG_SOI:
+		return {}
+
+	# the segments before the image data, looking for APP1 with EXIF
+	position = 2
+	tiff = None
+	while position + 4 <= len(data):
+		if data[position] != 0xFF:
+			return {}
+		marker = data[position + 1]
+		if marker == 0xFF:
+			position += 1 # fill byte
+			continue
+		if marker in (JPEG_SOS, JPEG_EOI):
+			return {}
+		length = struct.unpack_from('>H', data, position + 2)[0]
+		if marker == JPEG_APP1 and data[position + 4:position + 10] == EXIF_HEADER:
+			tiff = position + 10
+			end = min(position + 2 + length, len(data))
+			break
+		position += 2 + length
+	if tiff is None or tiff + 8 > end:
+		return {}
+
+	endian = '<' if data[tiff:tiff + 2] == b'II' else '>'
+	ifd0_offset = struct.unpack_from(endian + 'I', data, tiff + 4)[0]
+	ifd0, endian = find_ifd_entries(data, tiff, end, ifd0_offset)
+	ifds = [ifd0]
+	if piexif.ImageIFD.ExifTag in ifd0:
+		exif_offset = struct.unpack_from(endian + 'I', data, ifd0[piexif.ImageIFD.ExifTag] + 8)[0]
+		ifds.append(find_ifd_entries(data, tiff, end, exif_offset)[0])
+
+	offsets = {}
+	for ifd, tags in zip(ifds, [[piexif.ImageIFD.DateTime], DATE_TAGS]):
+		for tag in tags:
+			if tag not in ifd:
+				continue
+			value_type, count, value_offset = struct.unpack_from(endian + 'HII', data, ifd[tag] + 2)
+			if (value_type == TIFF_TYPE_ASCII and count == EXIF_DATE_LENGTH and
+					tiff + value_offset + EXIF_DATE_LENGTH <= end):
+				offsets[tag] = tiff + value_offset
+	return offsets
+
+
+def change_image_date_in_place(path, date=None, shift=None, name_pattern=None, dry_run=False, include_datetime=False):
+	''' Like change_image_date but overwriting only the bytes of the dates
+	(the file is memory-mapped so only the pages of the EXIF header are
+	read and written). Returns None if the image hasn't the dates in a
+	layout that allows it (see find_exif_date_offsets).'''
+
+	with open(path, 'rb' if dry_run else 'r+b') as f:
+		if os.fstat(f.fileno()).st_size == 0:
+			return None
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ if dry_run else mmap.ACCESS_WRITE) as data:
+			offsets = find_exif_date_offsets(data)
+			tags = DATE_TAGS + [piexif.ImageIFD.DateTime] if include_datetime else DATE_TAGS
+			if any(tag not in offsets for tag in tags):
+				return None
+
+			values = {tag: data[offsets[tag]:offsets[tag] + EXIF_DATE_LENGTH] for tag in tags}
+			previous = values[piexif.ExifIFD.DateTimeOriginal].decode('ascii', 'replace').strip('\x00 ') or None
+			creation_date = get_target_date(path, previous, date, shift, name_pattern)
+			if creation_date is None:
+				return ImageResult(path, 'skipped', previous, previous, 'no date to set')
+			value = creation_date.encode('ascii') + b'\x00'
+			if len(value) != EXIF_DATE_LENGTH:
+				return None
+			if all(current == value for current in values.values()):
+				return ImageResult(path, 'skipped', previous, previous, 'it already has the date')
+
+			if not dry_run:
+				for tag in tags:
+					data[offsets[tag]:offsets[tag] + EXIF_DATE_LENGTH] = value
+				data.flush()
+			return ImageResult(path, 'changed', previous, creation_date, None)
+
+
+def change_image_date(path, date=None, shift=None, name_pattern=None, dry_run=False, include_datetime=False, in_place=True):
+	''' Changes DateTimeOriginal and DateTimeDigitized (and DateTime if
+	include_datetime) of the image (see get_target_date), in place if
+	possible (see change_image_date_in_place) and if not writing the image
+	again with piexif. Returns an ImageResult (errors are not raised so a
+	wrong file doesn't stop the others).'''
+
+	previous = None
+	try:
+		if in_place:
+			result = change_image_date_in_place(path, date, shift, name_pattern, dry_run, include_datetime)
+			if result is not None:
+				return result
+
+		exif_dict = piexif.load(path)
+		previous = read_exif_date(exif_dict)
+
+		creation_date = get_target_date(path, previous, date, shift, name_pattern)
+		if creation_date is None:
+			return ImageResult(path, 'skipped', previous, previous, 'no date to set')
+		exif = exif_dict['Exif']
+		same_date = all(exif.get(tag) == creation_date.encode() for tag in DATE_TAGS)
+		if include_datetime:
+			same_date = same_date and exif_dict['0th'].get(piexif.ImageIFD.DateTime) == creation_date.encode()
+		if same_date:
+			return ImageResult(path, 'skipped', previous, previous, 'it already has the date')
+
+		if not dry_run:
+			for tag in DATE_TAGS:
+				exif[tag] = creation_date
+			if include_datetime:
+				exif_dict['0th'][piexif.ImageIFD.DateTime] = creation_date
+			exif_bytes = piexif.dump(exif_dict)
+			piexif.insert(exif_bytes, path)
+
+		# what was written is checked in exif_dict (the file is not read again)
+		current = exif[piexif.ExifIFD.DateTimeOriginal] if not dry_run else creation_date
+		return ImageResult(path, 'changed', previous, current, None)
+	except Exception as e:
+		return ImageResult(path, 'error', previous, None, type(e).__name__ + ': ' + str(e))
+
+
+def change_images_dates(paths, workers=None, **kwargs):
+	''' Generator that changes the date of the images (see change_image_date,
+	kwargs are passed to it) in a pool of workers processes (the number of
+	CPUs if None) and yields their ImageResult in the order of paths.'''
+
+	change = functools.partial(change_image_date, **kwargs)
+	if workers == 1:
+		yield from map(change, paths)
+		return
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		yield from executor.map(change, paths, chunksize=WORKER_CHUNK_SIZE)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Changes the date images were taken (EXIF DateTimeOriginal and DateTimeDigitized).')
+	parser.add_argument('paths', nargs='+', help='images or directories (walked recursively)')
+	target = parser.add_mutually_exclusive_group(required=True)
+	target.add_argument('--date', type=check_date, help='date to set, like "2019:08:16 19:00:00"')
+	target.add_argument('--shift', type=parse_shift,
+		help='time added to the current date, like +1d or +90s (negative ones like --shift=-2h30m)')
+	target.add_argument('--from-name', action='store_true', help='take the date from the file name (see --name-pattern)')
+	parser.add_argument('--name-pattern', default=FILENAME_DATE_PATTERN, metavar='REGEX',
+		help='regular expression of the dates in file names, with the groups year, month, day and optionally hour, minute, second')
+	parser.add_argument('--datetime', action='store_true', help='change also DateTime (the date the image was modified)')
+	parser.add_argument('--rewrite', action='store_true',
+		help='always write the whole image again with piexif (instead of overwriting the dates in place)')
+	parser.add_argument('--extensions', nargs='+', default=IMAGE_EXTENSIONS,
+		help='extensions of the images looked for in directories')
+	parser.add_argument('--workers', type=int, help='processes changing images at the same time (the number of CPUs by default)')
+	parser.add_argument('--dry-run', action='store_true', help="show the changes without writing them")
+	parser.add_argument('--quiet', action='store_true', help='show only the errors and the summary')
+	args = parser.parse_args()
 
-exif_dict = piexif.load(ifile)
-# print(exif_dict) # image's metadata
+	extensions = media_files.normalize_extensions(args.extensions)
+	results = change_images_dates(media_files.find_files(args.paths, extensions), args.workers,
+		date=args.date, shift=args.shift, name_pattern=args.name_pattern if args.from_name else None,
+		dry_run=args.dry_run, include_datetime=args.datetime, in_place=not args.rewrite)
 
-date = exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal]
-print('Previous date: ', date)
+	counts = {'changed': 0, 'skipped': 0, 'error': 0}
+	for result in results:
+		counts[result.status] += 1
+		if not args.quiet or result.status == 'error':
+			media_files.print_result(result, args.dry_run)
 
-creation_date = '2019:08:16 19:00:00'
+	media_files.print_summary(counts, args.dry_run)
+	return 1 if counts['error'] else 0
 
-exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal] = creation_date
-exif_dict['Exif'][piexif.ExifIFD.DateTimeDigitized] = creation_date
-exif_bytes = piexif.dump(exif_dict)
-piexif.insert(exif_bytes, ifile)
 
-exif_dict = piexif.load(ifile)
-date = exif_dict['Exif'][piexif.ExifIFD.DateTimeOriginal]
-print('Current date: ', date)
+if __name__ == "__main__":
+	sys.exit(main())
@@ -1,27 +1,221 @@
-# This script allows to change the creation_time metadata of a video file
+# This script allows to change the creation_time metadata of video files
 
+# The creation and modification times of the movie (mvhd box), its tracks
+# (tkhd) and their media (mdhd) are overwritten in place in MP4/MOV files
+# (only the headers are read and written). Other files are copied with
+# ffmpeg (codec='copy', every stream and its metadata) with the new
+# creation_time and then replace the original file.
+
+# For the files that can't be changed in place:
 # Install http://ffmpeg.org/ and make accesible its bin directory (like using environment variables)
 # Install: pip install ffmpeg-python
 
-
+# examples:
+# python change_metadata.py --date "2013-05-02 22:01:04" example.mp4
+# python change_metadata.py --date "2013-05-02 22:01:04" --dry-run videos/
 
 ''' author: Paco Abato - pacoabato@gmail.com'''
 
-import ffmpeg
+import argparse
+import mmap
+import os
+import struct
+import sys
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+import media_files
+
+# ffmpeg is imported only if a file must be copied (see change_video_date_remux)
+
+
+# dates are UTC (as shown by ffprobe)
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+VIDEO_EXTENSIONS = ['.mp4', '.m4v', '.mov', '.3gp']
+
+# times in MP4 are seconds since this date
+MP4_EPOCH = datetime(1904, 1, 1)
+# boxes that contain the boxes with times, and the boxes with times
+# (full boxes whose version 0 has 32 bits times and version 1 has 64 bits times)
+MP4_CONTAINER_BOXES = {b'moov', b'trak', b'mdia'}
+MP4_TIME_BOXES = {b'mvhd', b'tkhd', b'mdhd'}
+
+# status: 'changed' (or would be changed in a dry run), 'skipped' or 'error'
+VideoResult = namedtuple('VideoResult', ['path', 'status', 'previous', 'current', 'message'])
+
+
+def check_date(text):
+	''' Returns the date if it is in DATE_FORMAT (raises ValueError otherwise).'''
+
+	datetime.strptime(text, DATE_FORMAT)
+	return text
+
+
+def to_mp4_time(str_date):
+	return int((datetime.strptime(str_date, DATE_FORMAT) - MP4_EPOCH).total_seconds())
+
+
+def from_mp4_time(mp4_time):
+	return (MP4_EPOCH + timedelta(seconds=mp4_time)).strftime(DATE_FORMAT)
+
+
+def iter_boxes(data, start, end):
+	''' Generator that yields the type, the start of the content and the end
+	of each box (ISO-BMFF) between start and end of data. Raises ValueError
+	if a box doesn't fit.'''
+
+	position = start
+	while position + 8 <= end:
+		size, box_type = struct.unpack_from('>I4s', data, position)
+		content = position + 8
+		if size == 1:
+			if content + 8 > end:
+				raise ValueError('Truncated box: ' + repr(box_type))
+			size = struct.unpack_from('>Q', data, content)[0]
+			content += 8
+		elif size == 0:
+			size = end - position
+		box_end = position + size
+		if box_end > end or box_end < content:
+			raise ValueError('Wrong size of box: ' + repr(box_type))
+		yield box_type, content, box_end
+		position = box_end
+
+
+def find_time_boxes(data, start=0, end=None):
+	''' Returns the type and the start of the content of the boxes with
+	times (MP4_TIME_BOXES) in the order they are in data.'''
+
+	found = []
+	for box_type, content, box_end in iter_boxes(data, start, len(data) if end is None else end):
+		if box_type in MP4_TIME_BOXES:
+			found.append((box_type, content))
+		elif box_type in MP4_CONTAINER_BOXES:
+			found.extend(find_time_boxes(data, content, box_end))
+	return found
+
+
+def read_box_times(data, content):
+	''' Returns the version, the creation time and the modification time of
+	a box with times (see MP4_TIME_BOXES), or None if the version is unknown.'''
+
+	version = data[content]
+	if version == 0:
+		return (0,) + struct.unpack_from('>II', data, content + 4)
+	if version == 1:
+		return (1,) + struct.unpack_from('>QQ', data, content + 4)
+	return None
+
+
+def change_video_date_in_place(path, creation_date, dry_run=False):
+	''' Changes the creation and modification times of the movie, its tracks
+	and their media overwriting them in the file (memory-mapped so only the
+	pages of the headers are read and written). Returns a VideoResult or None
+	if the file can't be changed in place (it is not MP4/MOV or the date
+	doesn't fit in its boxes).'''
+
+	with open(path, 'rb' if dry_run else 'r+b') as f:
+		if os.fstat(f.fileno()).st_size == 0:
+			return None
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ if dry_run else mmap.ACCESS_WRITE) as data:
+			try:
+				boxes = find_time_boxes(data)
+			except ValueError:
+				return None
+			times = [read_box_times(data, content) for box_type, content in boxes]
+			if not boxes or boxes[0][0] != b'mvhd' or None in times:
+				return None
+
+			new_time = to_mp4_time(creation_date)
+			if new_time < 0 or (new_time >= 2 ** 32 and any(version == 0 for version, _, _ in times)):
+				return None
+
+			previous = from_mp4_time(times[0][1])
+			if all(creation == modification == new_time for _, creation, modification in times):
+				return VideoResult(path, 'skipped', previous, previous, 'it already has the date')
+
+			if not dry_run:
+				for (box_type, content), (version, _, _) in zip(boxes, times):
+					struct.pack_into('>II' if version == 0 else '>QQ', data, content + 4, new_time, new_time)
+				data.flush()
+			return VideoResult(path, 'changed', previous, creation_date, None)
+
+
+def change_video_date_remux(path, creation_date, dry_run=False):
+	''' Changes the creation_time of the video copying it with ffmpeg (the
+	streams are not encoded again) to a temporary file that then replaces
+	it. Returns a VideoResult.'''
+
+	import ffmpeg
+
+	tags = ffmpeg.probe(path)['format'].get('tags', {})
+	previous = tags.get('creation_time')
+	if previous is not None:
+		# like 2013-05-02T22:01:04.000000Z
+		previous = previous[:19].replace('T', ' ')
+	if dry_run:
+		return VideoResult(path, 'changed', previous, creation_date, None)
+
+	root, extension = os.path.splitext(path)
+	temporary = root + '.tmp' + extension
+	try:
+		(ffmpeg
+		.input(path)
+		# every stream (not only one video and one audio) with its metadata
+		.output(temporary, metadata='creation_time=' + creation_date.replace(' ', 'T') + 'Z', codec='copy',
+			map='0', map_metadata='0', copy_unknown=None)
+		.overwrite_output()
+		.run(quiet=True)
+		)
+		os.replace(temporary, path)
+	finally:
+		if os.path.exists(temporary):
+			os.remove(temporary)
+	return VideoResult(path, 'changed', previous, creation_date, None)
+
+
+def change_video_date(path, creation_date, dry_run=False, in_place=True):
+	''' Changes the creation time of the video, in place if possible (see
+	change_video_date_in_place) and if not copying it with ffmpeg. Returns
+	a VideoResult (errors are not raised so a wrong file doesn't stop the
+	others).'''
+
+	try:
+		if in_place:
+			result = change_video_date_in_place(path, creation_date, dry_run)
+			if result is not None:
+				return result
+		return change_video_date_remux(path, creation_date, dry_run)
+	except Exception as e:
+		message = type(e).__name__ + ': ' + str(e)
+		stderr = getattr(e, 'stderr', None)
+		if stderr:
+			message += ' - ' + stderr.decode(errors='replace').strip().splitlines()[-1]
+		return VideoResult(path, 'error', None, None, message)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Changes the creation time of videos.')
+	parser.add_argument('paths', nargs='+', help='videos or directories (walked recursively)')
+	parser.add_argument('--date', type=check_date, required=True, help='date to set (UTC), like "2013-05-02 22:01:04"')
+	parser.add_argument('--remux', action='store_true',
+		help='always copy the video with ffmpeg (instead of overwriting the times in place)')
+	parser.add_argument('--extensions', nargs='+', default=VIDEO_EXTENSIONS,
+		help='extensions of the videos looked for in directories')
+	parser.add_argument('--dry-run', action='store_true', help="show the changes without writing them")
+	args = parser.parse_args()
 
-ifile = 'example.mp4'
-ofile = 'result.mp4'
-creationdate = '2013-05-02 22:01:04'
-(ffmpeg
- .input(ifile)
- .output(ofile, metadata='creation_time=' + creationdate, codec='copy')
- .run()
- )
+	extensions = media_files.normalize_extensions(args.extensions)
+	counts = {'changed': 0, 'skipped': 0, 'error': 0}
+	for path in media_files.find_files(args.paths, extensions):
+		result = change_video_date(path, args.date, args.dry_run, not args.remux)
+		counts[result.status] += 1
+		media_files.print_result(result, args.dry_run)
 
-# codec='copy' in order to preserve the video quality (also execution time is a lot more faster)
+	media_files.print_summary(counts, args.dry_run)
+	return 1 if counts['error'] else 0
 
-probe = ffmpeg.probe(ifile)
-probe2 = ffmpeg.probe(ofile)
 
-print('Previous creation time: ', probe['format']['tags']['creation_time'])
-print('Current creation time: ', probe2['format']['tags']['creation_time'])
+if __name__ == "__main__":
+	sys.exit(main())
@@ -0,0 +1,48 @@
+# Helpers shared by change_image_metadata, change_metadata and scan_media
+# to find the files to change and show the results
+
+# Author: Paco Abato - pacoabato@gmail.com
+
+import os
+import sys
+
+
+def normalize_extensions(extensions):
+	''' Returns the extensions in lower case and starting with a dot
+	(like .jpg) as given in the command line (jpg, .JPG...).'''
+
+	return [extension.lower() if extension.startswith('.') else '.' + extension.lower()
+		for extension in extensions]
+
+
+def find_files(paths, extensions):
+	''' Generator that yields the files in paths (files, or directories
+	walked recursively looking for the given extensions) in order.'''
+
+	for path in paths:
+		if os.path.isdir(path):
+			for root, dirs, files in os.walk(path):
+				dirs.sort()
+				for name in sorted(files):
+					if os.path.splitext(name)[1].lower() in extensions:
+						yield os.path.join(root, name)
+		else:
+			yield path
+
+
+def print_result(result, dry_run):
+	''' Shows the result of changing a file (an ImageResult or a VideoResult).'''
+
+	if result.status == 'changed':
+		print(('[dry run] ' if dry_run else '') + result.path + ':', result.previous, '->', result.current)
+	elif result.status == 'error':
+		print(result.path + ': ERROR', result.message, file=sys.stderr)
+	else:
+		print(result.path + ': skipped,', result.message, '(' + str(result.previous) + ')')
+
+
+def print_summary(counts, dry_run):
+	''' Shows the number of files changed, skipped and with errors.'''
+
+	print('Changed:' if not dry_run else 'To change:', counts['changed'],
+		'- skipped:', counts['skipped'], '- errors:', counts['error'])
@@ -0,0 +1,380 @@
+# This script keeps a catalog (SQLite) of the dates of the images and videos
+# under a directory to find the ones whose date must be fixed, and fixes them
+# with change_image_metadata and change_metadata
+
+# Only the headers of the files are read (EXIF of images, boxes of videos).
+# Files whose size and modification time didn't change are not read again.
+
+# Install piexif (see change_image_metadata.py)
+
+# Author: Paco Abato - pacoabato@gmail.com
+
+# examples:
+# python scan_media.py scan photos/
+# python scan_media.py list mismatched
+# python scan_media.py fix mismatched --dry-run
+
+import argparse
+import mmap
+import os
+import re
+import sqlite3
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import change_image_metadata
+import change_metadata
+import media_files
+
+
+CATALOG_FILE = 'media_catalog.db'
+
+# dates in the catalog
+DATE_FORMAT = change_metadata.DATE_FORMAT
+
+# dates in the names of the directories like 2019, 2019-08 or 2019/08/16
+FOLDER_DATE_PATTERN = r'(?<!\d)((?:19|20)\d\d)(?:[-_/. ]([01]\d)(?:[-_/. ]([0-3]\d))?)?(?!\d)'
+
+# files read by each worker at once, and rows written to the catalog in each transaction
+WORKER_CHUNK_SIZE = 64
+CATALOG_BATCH_ROWS = 1000
+
+# root: the directory scanned (the dates of the directories are looked for under it)
+# mismatch: the embedded date isn't the one in the name of the file (or of its directories)
+CATALOG_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS media (
+	path TEXT PRIMARY KEY,
+	root TEXT NOT NULL,
+	kind TEXT NOT NULL,
+	size INTEGER NOT NULL,
+	mtime REAL NOT NULL,
+	exif_date TEXT,
+	creation_time TEXT,
+	name_date TEXT,
+	folder_date TEXT,
+	date TEXT,
+	date_source TEXT,
+	mismatch INTEGER NOT NULL DEFAULT 0,
+	error TEXT
+);
+CREATE INDEX IF NOT EXISTS media_mismatch ON media (mismatch);
+CREATE INDEX IF NOT EXISTS media_date_source ON media (date_source);
+'''
+
+# columns of the catalog read from the files (see read_media)
+MEDIA_COLUMNS = ['path', 'root', 'kind', 'size', 'mtime', 'exif_date', 'creation_time',
+	'name_date', 'folder_date', 'date', 'date_source', 'mismatch', 'error']
+INSERT_MEDIA = ('INSERT OR REPLACE INTO media (' + ', '.join(MEDIA_COLUMNS) +
+	') VALUES (' + ', '.join('?' * len(MEDIA_COLUMNS)) + ')')
+
+# files listed and fixed by each query:
+# mismatched: the embedded date disagrees with the date in the name of the file or its directories
+# missing: the file has no embedded date but its name has one
+QUERIES = {
+	'mismatched': 'mismatch = 1',
+	'missing': "date_source = 'filename'",
+	'all': '1 = 1',
+}
+
+
+def find_media(root):
+	''' Generator that yields the path and kind ('image' or 'video') of the
+	files under root.'''
+
+	for directory, dirs, files in os.walk(root):
+		dirs.sort()
+		for name in sorted(files):
+			extension = os.path.splitext(name)[1].lower()
+			if extension in change_image_metadata.IMAGE_EXTENSIONS:
+				yield os.path.join(directory, name), 'image'
+			elif extension in change_metadata.VIDEO_EXTENSIONS:
+				yield os.path.join(directory, name), 'video'
+
+
+def to_catalog_date(str_date, date_format):
+	''' Returns the date in DATE_FORMAT or None if it is not a valid date
+	(like the 0000:00:00 00:00:00 of some cameras).'''
+
+	try:
+		return datetime.strptime(str_date, date_format).strftime(DATE_FORMAT)
+	except ValueError:
+		return None
+
+
+def read_image_date(data):
+	''' Returns the DateTimeOriginal of the image in data or None (see
+	change_image_metadata.find_exif_date_offsets).'''
+
+	offset = change_image_metadata.find_exif_date_offsets(data).get(
+		change_image_metadata.piexif.ExifIFD.DateTimeOriginal)
+	if offset is None:
+		return None
+	value = data[offset:offset + change_image_metadata.EXIF_DATE_LENGTH - 1].decode('ascii', 'replace')
+	return to_catalog_date(value, change_image_metadata.EXIF_DATE_FORMAT)
+
+
+def read_image_date_full(path):
+	''' Returns the date of the image (see change_image_metadata.read_exif_date)
+	parsing its whole EXIF with piexif, or None.'''
+
+	value = change_image_metadata.read_exif_date(change_image_metadata.piexif.load(path))
+	if value is None:
+		return None
+	return to_catalog_date(value, change_image_metadata.EXIF_DATE_FORMAT)
+
+
+def read_video_date(data):
+	''' Returns the creation time of the movie (mvhd box) in data or None
+	(see change_metadata.find_time_boxes).'''
+
+	try:
+		boxes = change_metadata.find_time_boxes(data)
+	except ValueError:
+		return None
+	if not boxes or boxes[0][0] != b'mvhd':
+		return None
+	times = change_metadata.read_box_times(data, boxes[0][1])
+	# 0 means that the date was not set
+	if times is None or times[1] == 0:
+		return None
+	return change_metadata.from_mp4_time(times[1])
+
+
+def to_utc(str_date):
+	''' Converts a local date in DATE_FORMAT (like the ones in the names of
+	the files) to UTC (like the ones of the videos).'''
+
+	return datetime.strptime(str_date, DATE_FORMAT).astimezone(timezone.utc).strftime(DATE_FORMAT)
+
+
+def to_local(str_date):
+	''' Converts a UTC date in DATE_FORMAT to local time.'''
+
+	return datetime.strptime(str_date, DATE_FORMAT).replace(tzinfo=timezone.utc).astimezone().strftime(DATE_FORMAT)
+
+
+def folder_date(path, root):
+	''' Returns the date (the deepest one) in the directories of path under
+	root, like 2019, 2019-08 or 2019-08-16, or None.'''
+
+	directories = os.path.relpath(os.path.dirname(path), root).replace(os.sep, '/')
+	found = None
+	for match in re.finditer(FOLDER_DATE_PATTERN, directories):
+		parts = [part for part in match.groups() if part is not None]
+		if to_catalog_date('-'.join(parts), '-'.join(['%Y', '%m', '%d'][:len(parts)])) is not None:
+			found = '-'.join(parts)
+	return found
+
+
+def read_media(path, kind, root):
+	''' Returns the row of the catalog of a file (see MEDIA_COLUMNS) reading
+	only its headers (memory-mapped). Errors are kept in the row.'''
+
+	exif_date = creation_time = error = None
+	size = mtime = 0
+	try:
+		with open(path, 'rb') as f:
+			stat = os.fstat(f.fileno())
+			size, mtime = stat.st_size, stat.st_mtime
+			if size > 0:
+				with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+					if kind == 'image':
+						exif_date = read_image_date(data)
+					else:
+						creation_time = read_video_date(data)
+				if kind == 'image' and exif_date is None:
+					# only DateTimeDigitized or DateTime, or EXIF laid out in an unexpected way
+					exif_date = read_image_date_full(path)
+	except Exception as e:
+		error = type(e).__name__ + ': ' + str(e)
+
+	name_date = change_image_metadata.date_from_name(path)
+	if name_date is not None:
+		name_date = to_catalog_date(name_date, change_image_metadata.EXIF_DATE_FORMAT)
+	path_date = folder_date(path, root)
+
+	date = exif_date or creation_time
+	if date is not None:
+		date_source = 'exif' if exif_date else 'container'
+	elif name_date is not None:
+		date, date_source = name_date, 'filename'
+	elif path_date is not None:
+		date, date_source = path_date, 'folder'
+	else:
+		date_source = None
+
+	# the name of the file tells the day, the directories maybe only the year or month
+	expected = name_date[:10] if name_date is not None else path_date
+	# names and directories are in local time, videos in UTC
+	embedded = exif_date or (to_local(creation_time) if creation_time is not None else None)
+	mismatch = int(embedded is not None and expected is not None and not embedded.startswith(expected))
+
+	return (path, root, kind, size, mtime, exif_date, creation_time,
+		name_date, path_date, date, date_source, mismatch, error)
+
+
+def read_media_star(args):
+	return read_media(*args)
+
+
+def open_catalog(catalog_file):
+	catalog = sqlite3.connect(catalog_file)
+	catalog.executescript(CATALOG_SCHEMA)
+	return catalog
+
+
+def scan(catalog_file, root, workers=None):
+	''' Adds to the catalog the files under root, reads again the ones whose
+	size or modification time changed and removes the ones that don't exist
+	anymore. Returns the number of files read and removed.'''
+
+	root = os.path.abspath(root)
+	catalog = open_catalog(catalog_file)
+	try:
+		prefix = root.rstrip(os.sep) + os.sep
+		known = {}
+		for path, size, mtime in catalog.execute(
+				'SELECT path, size, mtime FROM media WHERE substr(path, 1, ?) = ?', (len(prefix), prefix)):
+			known[path] = (size, mtime)
+
+		pending = []
+		for path, kind in find_media(root):
+			stored = known.pop(path, None)
+			if stored is not None:
+				try:
+					stat = os.stat(path)
+				except OSError:
+					stat = None
+				if stat is not None and stored == (stat.st_size, stat.st_mtime):
+					continue
+			pending.append((path, kind, root))
+
+		read = 0
+		if workers == 1:
+			rows = map(read_media_star, pending)
+			executor = None
+		else:
+			executor = ProcessPoolExecutor(max_workers=workers)
+			rows = executor.map(read_media_star, pending, chunksize=WORKER_CHUNK_SIZE)
+		try:
+			batch = []
+			for row in rows:
+				batch.append(row)
+				read += 1
+				if len(batch) >= CATALOG_BATCH_ROWS:
+					catalog.executemany(INSERT_MEDIA, batch)
+					catalog.commit()
+					batch = []
+					print('Files read:', read, 'of', len(pending))
+			catalog.executemany(INSERT_MEDIA, batch)
+		finally:
+			if executor is not None:
+				executor.shutdown()
+
+		# the files under root that were not found
+		catalog.executemany('DELETE FROM media WHERE path = ?', [(path,) for path in known])
+		catalog.commit()
+		return read, len(known)
+	finally:
+		catalog.close()
+
+
+def find_files(catalog_file, query, root=None):
+	''' Returns the rows of the catalog (dicts) of a query (see QUERIES),
+	only the files under root if given.'''
+
+	catalog = open_catalog(catalog_file)
+	catalog.row_factory = sqlite3.Row
+	try:
+		sql = 'SELECT * FROM media WHERE ' + QUERIES[query]
+		params = []
+		if root is not None:
+			prefix = os.path.abspath(root).rstrip(os.sep) + os.sep
+			sql += ' AND substr(path, 1, ?) = ?'
+			params = [len(prefix), prefix]
+		return [dict(row) for row in catalog.execute(sql + ' ORDER BY path', params)]
+	finally:
+		catalog.close()
+
+
+def fix_file(row, dry_run=False):
+	''' Sets the date in the name of the file (see read_media) with
+	change_image_metadata or change_metadata. Returns their result or None
+	if the name of the file has no date (only its directories).'''
+
+	if row['name_date'] is None:
+		return None
+	if row['kind'] == 'image':
+		date = datetime.strptime(row['name_date'], DATE_FORMAT).strftime(change_image_metadata.EXIF_DATE_FORMAT)
+		return change_image_metadata.change_image_date(row['path'], date=date, dry_run=dry_run)
+	# videos' dates are UTC (see change_metadata), the names' ones local
+	return change_metadata.change_video_date(row['path'], to_utc(row['name_date']), dry_run)
+
+
+def fix(catalog_file, query, root=None, workers=None, dry_run=False):
+	''' Fixes the files of a query (see fix_file) in a pool of workers
+	processes and updates their rows in the catalog. Returns the number of
+	files changed, skipped and with errors.'''
+
+	rows = find_files(catalog_file, query, root)
+	counts = {'changed': 0, 'skipped': 0, 'error': 0}
+	fixed = []
+	with ProcessPoolExecutor(max_workers=workers) as executor:
+		for row, result in zip(rows, executor.map(fix_file, rows, [dry_run] * len(rows), chunksize=WORKER_CHUNK_SIZE)):
+			if result is None:
+				counts['skipped'] += 1
+				print(row['path'] + ': skipped, no date in its name (' + str(row['folder_date']) + ')')
+				continue
+			counts[result.status] += 1
+			media_files.print_result(result, dry_run)
+			if result.status == 'changed' and not dry_run:
+				fixed.append(row)
+
+	# the catalog shows the new dates
+	catalog = open_catalog(catalog_file)
+	try:
+		catalog.executemany(INSERT_MEDIA, [read_media(row['path'], row['kind'], row['root']) for row in fixed])
+		catalog.commit()
+	finally:
+		catalog.close()
+	return counts
+
+
+def main():
+	parser = argparse.ArgumentParser(description='Keeps a catalog of the dates of images and videos and fixes them.')
+	parser.add_argument('--catalog', default=CATALOG_FILE, help='SQLite file of the catalog')
+	parser.add_argument('--workers', type=int, help='processes reading or changing files at the same time (the number of CPUs by default)')
+	commands = parser.add_subparsers(dest='command', required=True)
+
+	scan_parser = commands.add_parser('scan', help='add to the catalog the images and videos under a directory')
+	scan_parser.add_argument('root')
+
+	for command, help in [('list', 'show the files of a query'), ('fix', 'set the date in their names to the files of a query')]:
+		command_parser = commands.add_parser(command, help=help)
+		command_parser.add_argument('query', choices=sorted(QUERIES) if command == 'list' else ['mismatched', 'missing'],
+			help='mismatched: the embedded date disagrees with the name of the file or of its directories; ' +
+				'missing: no embedded date but the name has one')
+		command_parser.add_argument('--root', help='only the files under this directory')
+		if command == 'fix':
+			command_parser.add_argument('--dry-run', action='store_true', help="show the changes without writing them")
+	args = parser.parse_args()
+
+	if args.command == 'scan':
+		read, removed = scan(args.catalog, args.root, args.workers)
+		print('Files read:', read, '- removed from the catalog:', removed)
+	elif args.command == 'list':
+		rows = find_files(args.catalog, args.query, args.root)
+		for row in rows:
+			print(row['path'], '|', row['kind'], '| embedded:', row['exif_date'] or row['creation_time'],
+				'| name:', row['name_date'], '| folder:', row['folder_date'], '| source:', row['date_source'])
+		print('Files:', len(rows))
+	else:
+		counts = fix(args.catalog, args.query, args.root, args.workers, args.dry_run)
+		media_files.print_summary(counts, args.dry_run)
+		return 1 if counts['error'] else 0
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())